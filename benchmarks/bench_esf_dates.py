@@ -0,0 +1,126 @@
+"""
+Benchmark du codec de dates ESF (scripts/esf_dates.py) contre les anciennes
+fonctions parse_esf_date / convert_esf_to_french_date, recopiées ci-dessous
+(avec zoneinfo à la place de pytz, qui n'est plus une dépendance du projet).
+Vérifie aussi que les résultats sont identiques.
+
+Usage : python3 benchmarks/bench_esf_dates.py [--input events.json] [--repeat 5]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import esf_dates  # noqa: E402
+
+
+# --- Anciennes implémentations (import_cal_et_gen_mail_v1.py / json_to_ics_generator.py) ---
+
+def legacy_convert_esf_to_french_date(esf_date):
+    match = re.match(r"/Date\((\d+)([+-]\d{4})?\)/", esf_date)
+    if not match:
+        raise ValueError(f"Format ESF invalide : {esf_date}")
+    timestamp_ms = int(match.group(1))
+    offset_str = match.group(2) or "+0000"
+    timestamp_sec = timestamp_ms // 1000
+    date_utc = datetime.utcfromtimestamp(timestamp_sec).replace(tzinfo=timezone.utc)
+    offset_hours = int(offset_str[:3])
+    date_adjusted = date_utc + timedelta(hours=offset_hours)
+    timezone_paris = ZoneInfo("Europe/Paris")
+    return date_adjusted.astimezone(timezone_paris).strftime("%d/%m/%Y %H:%M:%S")
+
+
+def legacy_parse_esf_date(esf_date):
+    match = re.match(r"/Date\((\d+)([+-]\d{4})?\)/", esf_date)
+    if not match:
+        raise ValueError(f"Format de date ESF invalide : {esf_date}")
+    timestamp_ms = int(match.group(1))
+    offset_str = match.group(2) or "+0000"
+    offset_h = int(offset_str[:3])
+    offset_m = int(offset_str[3:5]) if len(offset_str) > 3 else 0
+    tz_offset = timezone(timedelta(hours=offset_h, minutes=offset_m))
+    dt = datetime.fromtimestamp(timestamp_ms // 1000, tz=tz_offset)
+    tz_paris = ZoneInfo("Europe/Paris")
+    return dt.astimezone(tz_paris)
+
+
+def load_items(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["Items"], data.get("ServerTime") or "/Date(1740953500937)/"
+
+
+def timed(fn, repeat):
+    """Meilleur temps sur repeat exécutions"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du codec de dates ESF")
+    parser.add_argument("--input", "-i", default=str(ROOT / "events.json"))
+    parser.add_argument("--repeat", "-r", type=int, default=5)
+    parser.add_argument("--scale", "-s", type=int, default=100,
+                        help="Nombre de copies des événements (défaut: 100)")
+    args = parser.parse_args()
+
+    items, server_time = load_items(args.input)
+    items = items * args.scale
+    n = len(items)
+
+    # Vérification : résultats identiques
+    for item in items[:1000]:
+        for field in ("dd", "df", "dm"):
+            assert esf_dates.parse(item[field]) == legacy_parse_esf_date(item[field]), item[field]
+            assert esf_dates.to_french(item[field]) == legacy_convert_esf_to_french_date(item[field]), item[field]
+
+    # Charge réelle d'une conversion : dd, df, dm et ServerTime pour chaque événement
+    def legacy():
+        for item in items:
+            legacy_parse_esf_date(item["dd"])
+            legacy_parse_esf_date(item["df"])
+            legacy_convert_esf_to_french_date(item["dm"])
+            legacy_convert_esf_to_french_date(server_time)
+
+    def codec():
+        for item in items:
+            esf_dates.parse(item["dd"])
+            esf_dates.parse(item["df"])
+            esf_dates.to_french(item["dm"])
+            esf_dates.to_french(server_time)
+
+    def codec_cold():
+        esf_dates.parse.cache_clear()
+        esf_dates.to_french.cache_clear()
+        codec()
+
+    def bulk():
+        esf_dates.parse_columns(items)
+
+    results = {
+        "ancien code": timed(legacy, args.repeat),
+        "codec (cache vide)": timed(codec_cold, args.repeat),
+        "codec (cache chaud)": timed(codec, args.repeat),
+        "parse_columns dd/df/dm": timed(bulk, args.repeat),
+    }
+
+    print(f"{n} événements, meilleur temps sur {args.repeat} exécutions"
+          f" (NumPy {'disponible' if esf_dates.np is not None else 'absent'})")
+    reference = results["ancien code"]
+    for name, seconds in results.items():
+        print(f"  {name:<24} {seconds * 1000:9.1f} ms  {n / seconds:12.0f} év/s  x{reference / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Benchmark des étapes du pipeline sur des réponses ESF synthétiques (esf_synthetic.py) :
+filtrage (règles compilées), conversion Google Calendar
+(convert_esf_to_google_event), rendu ICS (ICSGenerator, sans puis avec cache de
+fragments) et calcul du plan de synchronisation (plan_changes).
+
+Pour chaque étape : meilleur temps sur --repeat exécutions (caches de dates
+vidés avant chaque exécution, comme dans un processus neuf), débit et pic
+mémoire (tracemalloc, mesuré lors d'une exécution séparée).
+Les résultats sont comparés à benchmarks/baseline.json : une étape plus lente
+que la référence au-delà de --tolerance est signalée et le code de sortie vaut 1.
+
+Usage :
+  python3 benchmarks/bench_pipeline.py --items 10000 100000 [--repeat 3]
+  python3 benchmarks/bench_pipeline.py --items 10000 --save-baseline
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "scripts"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+os.environ.setdefault("CALENDAR_ID", "benchmark")
+
+import esf_dates  # noqa: E402
+from esf_synthetic import generate_payload  # noqa: E402
+from filter_rules import load_rules  # noqa: E402
+from ics_fragments import FragmentCache  # noqa: E402
+from import_cal_et_gen_mail_v1 import convert_esf_to_google_event, event_hash, plan_changes  # noqa: E402
+from json_to_ics_generator import ICSGenerator  # noqa: E402
+from sync_state import SyncState  # noqa: E402
+from tri_json_2402_v0 import filter_events  # noqa: E402
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+
+
+def cold():
+    """Vide les caches partagés entre étapes (dates ESF)"""
+    esf_dates.parse.cache_clear()
+    esf_dates.to_french.cache_clear()
+
+
+def build_stages(data, workdir):
+    """Étapes à mesurer : nom -> (nombre d'éléments traités, fonction mesurée) ; la préparation n'est pas chronométrée"""
+    items = data["Items"]
+    server_time = data["ServerTime"]
+    filtered = filter_events(data, load_rules())["Items"]
+    generator = ICSGenerator()
+
+    def filter_dicts():
+        filter_events(data, load_rules())
+
+    def google_convert():
+        for item in filtered:
+            convert_esf_to_google_event(item, server_time)
+
+    def ics_render():
+        generator.write_ics_calendar(filtered, server_time, io.BytesIO())
+
+    warm_cache = FragmentCache(path=None)
+    generator.write_ics_calendar(filtered, server_time, io.BytesIO(), warm_cache)
+
+    def ics_cached():
+        generator.write_ics_calendar(filtered, server_time, io.BytesIO(), warm_cache)
+
+    # Index local : 90 % des cours déjà synchronisés, dont 5 % modifiés depuis
+    state = SyncState(os.path.join(workdir, "bench_sync_state.db"))
+    for k, item in enumerate(filtered):
+        if k % 10 == 0:
+            continue
+        gevent = convert_esf_to_google_event(item, server_time)
+        content = "modifié" if k % 20 == 1 else event_hash(gevent)
+        state.upsert(str(item["ih"]), f"g{k}", content, item["dm"], 0)
+
+    def calendar_diff():
+        plan_changes(filtered, server_time, state)
+
+    return {
+        "filter (dicts)": (len(items), filter_dicts),
+        "google convert": (len(filtered), google_convert),
+        "ics render": (len(filtered), ics_render),
+        "ics render (cache)": (len(filtered), ics_cached),
+        "calendar diff": (len(filtered), calendar_diff),
+    }
+
+
+def measure(fn, repeat):
+    """(meilleur temps en secondes, pic mémoire en octets)"""
+    best = float("inf")
+    for _ in range(repeat):
+        cold()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    cold()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(sizes, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            data = generate_payload(n)
+            for name, (count, fn) in build_stages(data, workdir).items():
+                seconds, peak = measure(fn, repeat)
+                results[f"{name} @{n}"] = {
+                    "items": count, "seconds": round(seconds, 6),
+                    "items_per_s": round(count / seconds) if seconds else None,
+                    "peak_mb": round(peak / 1e6, 2),
+                }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Affiche les résultats et retourne les étapes en régression"""
+    regressions = []
+    print(f"{'étape':<32} {'éléments':>9} {'temps':>10} {'év/s':>11} {'pic Mo':>8}  référence")
+    for key, r in results.items():
+        ref = baseline.get(key)
+        note = ""
+        if ref:
+            ratio = r["seconds"] / ref["seconds"] if ref["seconds"] else 1.0
+            note = f"x{ratio:.2f}"
+            if ratio > 1 + tolerance:
+                note += "  RÉGRESSION"
+                regressions.append(key)
+        print(f"{key:<32} {r['items']:>9} {r['seconds'] * 1000:>8.1f}ms {r['items_per_s'] or 0:>11} "
+              f"{r['peak_mb']:>8.2f}  {note}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des étapes du pipeline ESF")
+    parser.add_argument("--items", "-n", type=int, nargs="+", default=[10000],
+                        help="Taille(s) des réponses synthétiques (défaut: 10000)")
+    parser.add_argument("--repeat", "-r", type=int, default=3)
+    parser.add_argument("--baseline", default=str(BASELINE_FILE))
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Enregistre les résultats comme nouvelle référence")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Ralentissement toléré par rapport à la référence (défaut: 0.2 = 20 %%)")
+    parser.add_argument("--json", help="Écrit aussi les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    results = run(args.items, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({**baseline, **results}, f, ensure_ascii=False, indent=2)
+        print(f"Référence enregistrée dans {args.baseline}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} étape(s) plus lente(s) que la référence (tolérance {args.tolerance:.0%})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Benchmark du démarrage des scripts (passages cron courts) : pour chaque module,
+temps d'import dans un processus neuf (médiane sur --repeat lancements, interpréteur
+nu déduit) et imports les plus coûteux d'après python -X importtime.
+La dernière ligne mesure la création du client Calendar (get_google_calendar_service)
+avec un serveur de remplacement : aucune requête n'est envoyée, seul le document
+de découverte fourni avec googleapiclient est chargé.
+
+Usage :
+  python3 benchmarks/bench_startup.py [--repeat 5] [--top 5] [--json startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ROOT / "scripts"
+
+MODULES = [
+    "esf_pipeline",
+    "recuperation_json_2402_final",
+    "tri_json_2402_v0",
+    "import_cal_et_gen_mail_v1",
+    "json_to_ics_generator",
+    "ics_shards",
+    "ics_server",
+]
+
+SERVICE_CODE = (
+    "import import_cal_et_gen_mail_v1 as m\n"
+    "m.get_google_calendar_service()\n"
+)
+
+ENV = {
+    **os.environ,
+    "PYTHONPATH": os.pathsep.join(filter(None, [str(SCRIPTS), os.environ.get("PYTHONPATH")])),
+    "CALENDAR_ID": os.environ.get("CALENDAR_ID", "benchmark"),
+    # Client sans authentification ni réseau (voir benchmarks/fake_services.py)
+    "GOOGLE_API_ENDPOINT": os.environ.get("GOOGLE_API_ENDPOINT", "http://127.0.0.1:8092/calendar/v3/"),
+}
+
+
+def run_once(code, importtime=False):
+    """(durée du processus en secondes, sortie d'erreur)"""
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    start = time.perf_counter()
+    result = subprocess.run(args, env=ENV, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else code)
+    return elapsed, result.stderr
+
+
+def median_time(code, repeat):
+    return statistics.median(run_once(code)[0] for _ in range(repeat))
+
+
+def heaviest_imports(code, top, exclude=()):
+    """
+    Imports les plus coûteux après le démarrage de l'interpréteur (temps cumulé en ms) :
+    modules importés par le code mesuré et leurs imports directs.
+    """
+    _, stderr = run_once(code, importtime=True)
+    imports = []
+    started = False
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # en-tête
+        depth = (len(name) - len(name.lstrip())) // 2
+        if not started:
+            # Les imports du démarrage (site, encodings...) précèdent la ligne de site
+            started = depth == 0 and name.strip() == "site"
+            continue
+        if depth <= 1 and name.strip() not in exclude:
+            imports.append((int(cumulative) / 1000, name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps de démarrage des scripts ESF")
+    parser.add_argument("--repeat", "-r", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Nombre d'imports coûteux affichés par module")
+    parser.add_argument("--json", help="Écrit aussi les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    interpreter = median_time("pass", args.repeat)
+    print(f"Interpréteur seul : {interpreter * 1000:.1f} ms (déduit des mesures)")
+    print(f"{'module':<36} {'import':>10}  imports les plus coûteux")
+
+    results = {}
+    targets = [(m, f"import {m}") for m in MODULES] + [("get_google_calendar_service", SERVICE_CODE)]
+    for name, code in targets:
+        try:
+            seconds = median_time(code, args.repeat) - interpreter
+            heavy = heaviest_imports(code, args.top, exclude=(name,))
+        except RuntimeError as e:
+            print(f"{name:<36} {'échec':>10}  {e}")
+            continue
+        results[name] = {"ms": round(seconds * 1000, 1), "imports": {n: round(ms, 1) for ms, n in heavy}}
+        detail = ", ".join(f"{n} {ms:.0f}" for ms, n in heavy)
+        print(f"{name:<36} {seconds * 1000:>8.1f}ms  {detail}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"interpreter_ms": round(interpreter * 1000, 1), "results": results},
+                      f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
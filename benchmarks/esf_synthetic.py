@@ -0,0 +1,141 @@
+"""
+Générateur de réponses GetListeHorairesMoniteur synthétiques, calquées sur
+events.json : mêmes clés et mêmes types, plusieurs écoles de moniteurs (im),
+types de cours (ctp/lp), lieux de rendez-vous (llr), offsets /Date(...)/
+mélangés (+0100 l'hiver, +0200 après le passage à l'heure d'été) et champs
+optionnels (cours privés, niveaux, langues).
+Le résultat est déterministe pour une graine donnée.
+
+Usage : python3 benchmarks/esf_synthetic.py --items 100000 --output /tmp/events_100k.json
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+PARIS = ZoneInfo("Europe/Paris")
+
+# (ctp, ictp, cp, lp, poids) : types de cours observés dans les réponses ESF
+LESSON_TYPES = [
+    ("ABS", 16, "ABSENT", "ABSENT", 30),
+    ("ABS", 16, "ABSENCEMONO", "ABSENCE MONO", 3),
+    ("CC", 9, "C-OURSON-MAT", "CHARM OURSON MATIN", 12),
+    ("CC", 9, "C-FLOCON-AM", "CHARM FLOCON APRES-MIDI", 10),
+    ("CC", 9, "C-ETOILE-MAT", "ETOILES MATIN", 10),
+    ("CE", 11, "C-ENFANT-JOUR", "COURS ENFANT JOURNEE", 6),
+    ("LP", 10, "CP", "COURS PRIVE ", 20),
+    ("LP", 10, "CP-SNOW", "COURS PRIVE SNOWBOARD", 5),
+    ("COR", 12, "CORVEE", "CORVEE CHARMIEUX", 4),
+]
+PLACES = [
+    (13957256, "CHARMIEUX"), (13957257, "ROSAY SOMMET TELECABINE"), (13957258, "FRONT DE NEIGE"),
+    (13957259, "JARDIN D'ENFANTS"), (13957260, "CHALET DES MONITEURS"), (13957261, "PLATEAU DES LOUPS"),
+    (13957262, "TELESIEGE DES CRETES"), (13957263, "COL DU FORNET"), (13957264, "MAISON DE L'ESF"),
+    (13957265, "PIED DES PISTES"), (13957266, "GARE D'ARRIVEE"), (13957267, "LAC GELE"),
+]
+LEVELS = [
+    (3, "ALPOUR", "Ourson (A)"), (56, "ALPPIO", "Piou-Piou (A)"), (4, "ALPFLO", "Flocon (A)"),
+    (5, "ALPET1", "1ère étoile (A)"), (6, "ALPET2", "2ème étoile (A)"), (7, "ALPET3", "3ème étoile (A)"),
+]
+LANGUAGES = [(10715358, "FRA", "Français"), (10715359, "ANG", "Anglais"), (10715360, "ALL", "Allemand")]
+SPORTS = [(14769148, "SKIALPIN", "SKI ALPIN"), (14769149, "SNOW", "SNOWBOARD")]
+COMMENTS = ["", "", "", "Client en retard", "Prévoir casque", "Rendez-vous au chalet, appeler le 06 00 00 00 00"]
+# (heure de début, durée en minutes)
+SLOTS = [(9, 60), (9, 135), (10, 60), (11, 60), (13, 60), (14, 135), (15, 60), (9, 480)]
+
+
+def esf_date(dt):
+    """Datetime aware -> /Date(ms+hhmm)/ avec l'offset de Paris à cette date"""
+    local = dt.astimezone(PARIS)
+    offset = int(local.utcoffset().total_seconds() // 60)
+    sign = "+" if offset >= 0 else "-"
+    return f"/Date({int(dt.timestamp() * 1000)}{sign}{abs(offset) // 60:02d}{abs(offset) % 60:02d})/"
+
+
+def generate_items(n, instructors=None, season=2025, seed=42):
+    """Génère n événements ESF (liste de dicts)"""
+    rng = random.Random(seed)
+    instructors = instructors or max(10, n // 2000)
+    ims = [19358136 + k for k in range(instructors)]
+    types, weights = LESSON_TYPES, [t[4] for t in LESSON_TYPES]
+    season_start = datetime(season - 1, 12, 20, tzinfo=PARIS)
+    season_days = (datetime(season, 4, 30, tzinfo=PARIS) - season_start).days
+    base_ih = 20000000
+
+    items = []
+    for k in range(n):
+        ctp, ictp, cp, lp, _ = rng.choices(types, weights)[0]
+        hour, minutes = rng.choice(SLOTS)
+        day = season_start + timedelta(days=rng.randrange(season_days))
+        start = day.replace(hour=hour, minute=0).astimezone(timezone.utc)
+        end = start + timedelta(minutes=minutes)
+        modified = start - timedelta(days=rng.randrange(1, 200), seconds=rng.randrange(86400),
+                                     milliseconds=rng.randrange(1000))
+        item = {
+            "ih": base_ih + k, "ip": 23957000 + rng.randrange(1000), "ipp": 16000000 + rng.randrange(4000000),
+            "cp": cp, "lp": lp, "ictp": ictp, "ctp": ctp, "ittp": 15458240 + ictp,
+            "dd": esf_date(start), "df": esf_date(end), "ilr": 0,
+        }
+        if ctp != "ABS":
+            ilr, place = rng.choice(PLACES)
+            sport = rng.choice(SPORTS)
+            level = rng.choice(LEVELS)
+            language = rng.choices(LANGUAGES, [8, 3, 1])[0]
+            item.update({
+                "ilr": ilr, "clr": place, "llr": place,
+                "is": sport[0], "cs": sport[1], "ls": sport[2],
+                "ine": level[0], "cne": level[1], "lne": level[2],
+                "ile": language[0], "cle": language[1], "lle": language[2],
+                "nl": float(rng.randrange(1, 10)),
+            })
+        else:
+            item.update({"is": 0, "ine": 0, "ile": 0, "nl": 0.0})
+        if rng.random() < 0.95:
+            comment = rng.choice(COMMENTS)
+            item.update({"cm": comment, "cmmono": comment})
+        item["im"] = rng.choice(ims)
+        if ctp == "CC":
+            item["ctb"] = "TOUT"
+        if ctp == "LP":
+            item.update({
+                "cta": "ATT", "ivp": 27435000 + rng.randrange(1000), "ix": rng.randrange(1, 4),
+                "tt": rng.randrange(1, 10), "ec": False, "er": False, "vc": False, "fc": False,
+                "pc": rng.random() < 0.5,
+            })
+        item.update({
+            "sb": False, "sp": False, "dm": esf_date(modified), "nu": 0, "re": rng.random() < 0.1,
+        })
+        if ctp == "LP":
+            item["ei"] = False
+        items.append(item)
+    return items
+
+
+def generate_payload(n, instructors=None, season=2025, seed=42):
+    """Réponse complète : {"Items": [...], "Page", "Pages", "Total", "ServerTime"}"""
+    server_time = datetime(season, 3, 2, 22, 11, 40, tzinfo=timezone.utc)
+    return {
+        "Items": generate_items(n, instructors, season, seed),
+        "Page": 0, "Pages": 0, "Total": 0,
+        "ServerTime": f"/Date({int(server_time.timestamp() * 1000)})/",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère une réponse ESF synthétique")
+    parser.add_argument("--items", "-n", type=int, default=10000)
+    parser.add_argument("--instructors", type=int, default=None,
+                        help="Nombre de moniteurs (défaut: 1 pour 2000 événements, 10 minimum)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", "-o", default="events_synthetic.json")
+    args = parser.parse_args()
+
+    payload = generate_payload(args.items, args.instructors, seed=args.seed)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"{args.items} événements écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
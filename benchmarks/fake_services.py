@@ -0,0 +1,543 @@
+"""
+Serveurs de remplacement locaux pour les tests de bout en bout et de charge,
+sans toucher aux services de production :
+
+- esf : site ESF (page d'accueil, connexion sur le fournisseur d'identité,
+  page planning) et AjaxProxyService.svc/InvokeMethod (GetListeHorairesMoniteur)
+  sur un planning synthétique (esf_synthetic.py) ;
+- calendar : API Google Calendar v3 (events.list / insert / patch / delete,
+  requêtes batch, syncToken et 410 Gone).
+
+Les deux serveurs peuvent ajouter de la latence et des erreurs (--latency,
+--error-rate, --quota) pour éprouver la concurrence et les nouvelles tentatives.
+Au démarrage, ils affichent les variables d'environnement qui redirigent les
+scripts vers eux.
+
+Usage :
+  python3 benchmarks/fake_services.py esf --port 8090 --items 20000 --latency 50
+  python3 benchmarks/fake_services.py calendar --port 8092 --quota 10 --error-rate 0.02
+"""
+import argparse
+import email.parser
+import itertools
+import json
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from esf_synthetic import esf_date, generate_items  # noqa: E402
+
+ESF_MS_RE = re.compile(r"/Date\((-?\d+)")
+
+
+class Faults:
+    """Latence et erreurs injectées ; compteurs de requêtes"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, quota=0.0, seed=None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.quota = quota
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = (0, 0)  # (seconde courante, requêtes dans cette seconde)
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0}
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def check(self):
+        """None si la requête passe, sinon "quota" ou "error" """
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.quota:
+                second = int(time.monotonic())
+                current, count = self.window
+                count = count + 1 if current == second else 1
+                self.window = (second, count)
+                if count > self.quota:
+                    self.stats["throttled"] += 1
+                    return "quota"
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return "error"
+        return None
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Base commune : lecture du corps, réponses JSON, journalisation discrète"""
+
+    protocol_version = "HTTP/1.1"
+
+    def body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def send(self, status, body=b"", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            headers = {"Content-Type": "application/json; charset=UTF-8", **(headers or {})}
+        elif isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+# --- ESF -------------------------------------------------------------------
+
+HOME_PAGE = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>Carnet rouge ESF</title></head>
+<body><h1>Carnet rouge</h1>{link}</body></html>"""
+
+LOGIN_PAGE = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>Connexion ESF</title></head>
+<body><form method="post" action="{action}">
+<input id="LoginVM_Login" name="LoginVM.Login"><input id="LoginVM_MotDePasse" name="LoginVM.MotDePasse" type="password">
+<button type="submit">Se connecter</button></form></body></html>"""
+
+PLANNING_PAGE = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>Planning</title></head>
+<body><div id="planning"></div><script>
+fetch("AjaxProxyService.svc/InvokeMethod?IPlanningParticulierServicePublic&GetListeHorairesMoniteur",
+      {{method: "POST", headers: {{"Content-Type": "application/json"}}, body: "{{}}"}})
+  .then(r => r.json()).then(d => document.getElementById("planning").textContent = d.Items.length + " cours");
+</script></body></html>"""
+
+
+class ESFState:
+    """Planning synthétique, sessions et tickets SSO"""
+
+    def __init__(self, items, username, password, session_ttl):
+        self.items = {item["ih"]: item for item in items}
+        self.username = username
+        self.password = password
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self.tickets = set()
+        self.lock = threading.Lock()
+        self.rng = random.Random(0)
+
+    def new_session(self):
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[token] = time.time() + self.session_ttl
+        return token
+
+    def valid(self, cookie_header):
+        for part in (cookie_header or "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "ESFSESSION":
+                with self.lock:
+                    return self.sessions.get(value, 0) > time.time()
+        return False
+
+    def touch(self, modified=0, removed=0):
+        """Simule l'activité du secrétariat : cours modifiés (dm = maintenant) ou supprimés"""
+        now = datetime.now(timezone.utc)
+        with self.lock:
+            ihs = list(self.items)
+            for ih in self.rng.sample(ihs, min(removed, len(ihs))):
+                del self.items[ih]
+            ihs = list(self.items)
+            for ih in self.rng.sample(ihs, min(modified, len(ihs))):
+                item = dict(self.items[ih], dm=esf_date(now))
+                item["cm"] = item["cmmono"] = f"Modifié le {now:%d/%m %H:%M:%S}"
+                self.items[ih] = item
+
+    def query(self, params):
+        """Réponse GetListeHorairesMoniteur pour les paramètres de la requête"""
+        moniteurs = {int(m) for m in params.get("idTecMoniteurList", [])}
+        low = _esf_ms(params.get("dateHeureDebut"))
+        high = _esf_ms(params.get("dateHeureFin"))
+        delta = _esf_ms(params.get("dateReferenceDelta"))
+        with self.lock:
+            items = list(self.items.values())
+        selected = [
+            item for item in items
+            if (not moniteurs or item["im"] in moniteurs)
+            and (low is None or _esf_ms(item["dd"]) >= low)
+            and (high is None or _esf_ms(item["dd"]) < high)
+            and (delta is None or _esf_ms(item["dm"]) > delta)
+        ]
+        return {
+            "Items": selected, "Page": 0, "Pages": 0, "Total": len(selected),
+            "ServerTime": f"/Date({int(time.time() * 1000)})/",
+        }
+
+
+def _esf_ms(value):
+    """/Date(ms±hhmm)/ -> ms (None si absent)"""
+    match = ESF_MS_RE.match(value or "")
+    return int(match.group(1)) if match else None
+
+
+class ESFHandler(FakeHandler):
+    """
+    /                       accueil (lien "Connexion" si la session est absente)
+    /identity/login         formulaire du fournisseur d'identité
+    /auth/callback          retour SSO : pose le cookie ESFSESSION
+    /PlanningParticulierSSO/PlanningParticulier.aspx   page planning
+    /PlanningParticulierSSO/AjaxProxyService.svc/InvokeMethod   API (POST)
+    /_admin/touch?modified=N&removed=N   modifie / supprime des cours
+    /_admin/stats           compteurs
+    """
+
+    def do_GET(self):
+        state, url = self.server.state, urlsplit(self.path)
+        if url.path == "/_admin/stats":
+            return self.send(200, {**self.server.faults.stats, "items": len(state.items)})
+        self.server.faults.delay()
+        logged_in = state.valid(self.headers.get("Cookie"))
+        if url.path == "/":
+            link = "" if logged_in else f'<a title="Connexion" href="{self.server.identity_url}login">Connexion</a>'
+            return self.send(200, HOME_PAGE.format(link=link), {"Content-Type": "text/html; charset=utf-8"})
+        if url.path == "/identity/login":
+            page = LOGIN_PAGE.format(action=f"{self.server.identity_url}login")
+            return self.send(200, page, {"Content-Type": "text/html; charset=utf-8"})
+        if url.path == "/auth/callback":
+            ticket = parse_qs(url.query).get("ticket", [""])[0]
+            with state.lock:
+                known = ticket in state.tickets
+                state.tickets.discard(ticket)
+            if not known:
+                return self.send(403, "Ticket invalide")
+            token = state.new_session()
+            return self.send(302, headers={
+                "Location": "/",
+                "Set-Cookie": f"ESFSESSION={token}; Path=/; Max-Age={state.session_ttl}; HttpOnly",
+            })
+        if url.path.endswith("/PlanningParticulier.aspx"):
+            if not logged_in:
+                return self.send(302, headers={"Location": f"{self.server.identity_url}login"})
+            return self.send(200, PLANNING_PAGE.format(), {"Content-Type": "text/html; charset=utf-8"})
+        self.send(404, "Introuvable")
+
+    def do_POST(self):
+        state, url = self.server.state, urlsplit(self.path)
+        body = self.body()
+        if url.path == "/_admin/touch":
+            query = parse_qs(url.query)
+            state.touch(int(query.get("modified", ["0"])[0]), int(query.get("removed", ["0"])[0]))
+            return self.send(200, {"items": len(state.items)})
+        self.server.faults.delay()
+        if url.path == "/identity/login":
+            form = parse_qs(body.decode("utf-8"))
+            user = form.get("LoginVM.Login", [""])[0]
+            pwd = form.get("LoginVM.MotDePasse", [""])[0]
+            if state.username and (user, pwd) != (state.username, state.password):
+                page = LOGIN_PAGE.format(action=f"{self.server.identity_url}login")
+                return self.send(200, page, {"Content-Type": "text/html; charset=utf-8"})
+            ticket = secrets.token_hex(8)
+            with state.lock:
+                state.tickets.add(ticket)
+            return self.send(302, headers={"Location": f"{self.server.home_url}auth/callback?ticket={ticket}"})
+        if url.path.endswith("/AjaxProxyService.svc/InvokeMethod"):
+            if not state.valid(self.headers.get("Cookie")):
+                # Comme le vrai serveur : redirection vers la connexion
+                return self.send(302, headers={"Location": f"{self.server.identity_url}login"})
+            fault = self.server.faults.check()
+            if fault:
+                return self.send(503 if fault == "error" else 429, "Service indisponible")
+            try:
+                request = json.loads(body or b"{}")
+                params = json.loads(request.get("methodParams") or "{}")
+            except ValueError:
+                return self.send(400, "Requête invalide")
+            return self.send(200, state.query(params))
+        self.send(404, "Introuvable")
+
+
+# --- Google Calendar -----------------------------------------------------
+
+def _api_error(code, reason, message):
+    return code, {"error": {"errors": [{"domain": "global", "reason": reason, "message": message}],
+                            "code": code, "message": message}}
+
+
+class CalendarState:
+    """Événements de tous les calendriers ; chaque modification reçoit un numéro de séquence"""
+
+    def __init__(self, page_size):
+        self.events = {}  # (calendarId, id) -> événement
+        self.seq = itertools.count(1)
+        self.last_seq = 0
+        self.min_sync_seq = 0  # syncToken antérieurs : 410 Gone
+        self.page_size = page_size
+        self.lock = threading.Lock()
+
+    def _stamp(self, event):
+        self.last_seq = next(self.seq)
+        event["_seq"] = self.last_seq
+        event["updated"] = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        event["etag"] = f'"{self.last_seq}"'
+
+    @staticmethod
+    def public(event):
+        return {k: v for k, v in event.items() if not k.startswith("_")}
+
+    def list(self, calendar_id, query):
+        q = {k: v[0] for k, v in query.items()}
+        page_size = min(int(q.get("maxResults", 250)), 2500, self.page_size)
+        offset, snapshot = 0, None
+        if q.get("pageToken"):
+            offset, snapshot = (int(x) for x in q["pageToken"].split(":"))
+        with self.lock:
+            snapshot = snapshot or self.last_seq
+            events = [e for (cid, _), e in self.events.items() if cid == calendar_id and e["_seq"] <= snapshot]
+            if q.get("syncToken"):
+                since = int(q["syncToken"].lstrip("s"))
+                if since < self.min_sync_seq:
+                    return _api_error(410, "fullSyncRequired", "Sync token is no longer valid, a full sync is required.")
+                events = [e for e in events if e["_seq"] > since]
+            else:
+                if q.get("showDeleted") != "true":
+                    events = [e for e in events if e["status"] != "cancelled"]
+                if q.get("timeMin"):
+                    low = _parse_time(q["timeMin"])
+                    events = [e for e in events if _parse_time(e["end"]["dateTime"]) > low]
+                if q.get("timeMax"):
+                    high = _parse_time(q["timeMax"])
+                    events = [e for e in events if _parse_time(e["start"]["dateTime"]) < high]
+                if q.get("privateExtendedProperty"):
+                    key, _, value = q["privateExtendedProperty"].partition("=")
+                    events = [e for e in events
+                              if e.get("extendedProperties", {}).get("private", {}).get(key) == value]
+            events.sort(key=lambda e: e["_seq"])
+            page = [self.public(e) for e in events[offset:offset + page_size]]
+        result = {"kind": "calendar#events", "items": page}
+        if offset + page_size < len(events):
+            result["nextPageToken"] = f"{offset + page_size}:{snapshot}"
+        else:
+            result["nextSyncToken"] = f"s{snapshot}"
+        return 200, result
+
+    def insert(self, calendar_id, body):
+        event = {**body, "kind": "calendar#event", "id": body.get("id") or uuid.uuid4().hex,
+                 "status": body.get("status", "confirmed")}
+        with self.lock:
+            if (calendar_id, event["id"]) in self.events:
+                # Comme Google : un identifiant déjà utilisé, même supprimé, est refusé
+                return _api_error(409, "duplicate", "The requested identifier already exists.")
+            self._stamp(event)
+            self.events[(calendar_id, event["id"])] = event
+            return 200, self.public(event)
+
+    def patch(self, calendar_id, event_id, body):
+        with self.lock:
+            event = self.events.get((calendar_id, event_id))
+            if event is None:
+                return _api_error(404, "notFound", "Not Found")
+            for key, value in body.items():
+                if isinstance(value, dict) and isinstance(event.get(key), dict):
+                    event[key] = {**event[key], **value}
+                else:
+                    event[key] = value
+            self._stamp(event)
+            return 200, self.public(event)
+
+    def delete(self, calendar_id, event_id):
+        with self.lock:
+            event = self.events.get((calendar_id, event_id))
+            if event is None:
+                return _api_error(404, "notFound", "Not Found")
+            if event["status"] == "cancelled":
+                return _api_error(410, "deleted", "Resource has been deleted")
+            event["status"] = "cancelled"
+            self._stamp(event)
+            return 204, None
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class CalendarHandler(FakeHandler):
+    """
+    /calendar/v3/calendars/{calendarId}/events[/{eventId}]   API Calendar
+    /batch/calendar/v3                                       requêtes batch (multipart/mixed)
+    /_admin/expire-sync-tokens   les syncToken existants renvoient 410 Gone
+    /_admin/stats                compteurs
+    """
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def do_PATCH(self):
+        self.dispatch()
+
+    def do_DELETE(self):
+        self.dispatch()
+
+    def dispatch(self):
+        url = urlsplit(self.path)
+        body = self.body()
+        if url.path == "/_admin/stats":
+            with self.server.state.lock:
+                count = sum(1 for e in self.server.state.events.values() if e["status"] != "cancelled")
+            return self.send(200, {**self.server.faults.stats, "events": count})
+        if url.path == "/_admin/expire-sync-tokens":
+            with self.server.state.lock:
+                self.server.state.min_sync_seq = self.server.state.last_seq + 1
+            return self.send(200, {})
+        self.server.faults.delay()
+        if url.path.startswith("/batch/"):
+            return self.batch(body)
+        status, payload = self.route(self.command, url.path, parse_qs(url.query), body)
+        self.send(status, payload if payload is not None else b"")
+
+    def route(self, method, path, query, body):
+        """Appel API unitaire -> (statut, corps JSON ou None)"""
+        fault = self.server.faults.check()
+        if fault == "quota":
+            return _api_error(403, "rateLimitExceeded", "Rate Limit Exceeded")
+        if fault == "error":
+            return _api_error(503, "backendError", "Backend Error")
+
+        parts = path.strip("/").split("/")
+        # calendar / v3 / calendars / {calendarId} / events [/ {eventId}]
+        if len(parts) < 5 or parts[:3] != ["calendar", "v3", "calendars"] or parts[4] != "events":
+            return _api_error(404, "notFound", "Not Found")
+        calendar_id, event_id = parts[3], parts[5] if len(parts) > 5 else None
+        state = self.server.state
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return _api_error(400, "parseError", "Parse Error")
+        if method == "GET" and event_id is None:
+            return state.list(calendar_id, query)
+        if method == "POST" and event_id is None:
+            return state.insert(calendar_id, data)
+        if method in ("PATCH", "PUT") and event_id:
+            return state.patch(calendar_id, event_id, data)
+        if method == "DELETE" and event_id:
+            return state.delete(calendar_id, event_id)
+        return _api_error(405, "methodNotAllowed", "Method Not Allowed")
+
+    def batch(self, body):
+        """Requête batch : chaque partie application/http est traitée comme un appel séparé"""
+        content_type = self.headers.get("Content-Type", "")
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+        if not message.is_multipart():
+            return self.send(400, "multipart/mixed attendu")
+
+        boundary = f"batch_{uuid.uuid4().hex}"
+        out = []
+        for part in message.get_payload():
+            raw = part.get_payload()
+            head, _, sub_body = raw.replace("\r\n", "\n").partition("\n\n")
+            request_line = head.split("\n", 1)[0]
+            method, target, _ = request_line.split(" ", 2)
+            url = urlsplit(target)
+            status, payload = self.route(method, url.path, parse_qs(url.query), sub_body.encode("utf-8"))
+            content = json.dumps(payload, ensure_ascii=False) if payload is not None else ""
+            reason = {200: "OK", 204: "No Content"}.get(status, "Error")
+            content_id = part["Content-ID"] or ""
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id.strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{content}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        self.send(200, "".join(out), {"Content-Type": f"multipart/mixed; boundary={boundary}"})
+
+
+# --- Lancement -------------------------------------------------------------
+
+def make_server(kind, host, port, faults, verbose=False, **options):
+    handler = ESFHandler if kind == "esf" else CalendarHandler
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.faults = faults
+    server.verbose = verbose
+    if kind == "esf":
+        # Fournisseur d'identité sur un autre nom d'hôte, comme identity.w-esf.com
+        server.home_url = f"http://{host}:{port}/"
+        server.identity_url = f"http://{options['identity_host']}:{port}/identity/"
+        server.state = ESFState(options["items"], options["username"], options["password"],
+                                options["session_ttl"])
+    else:
+        server.state = CalendarState(options["page_size"])
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveurs ESF / Google Calendar de test")
+    parser.add_argument("kind", choices=("esf", "calendar"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", "-p", type=int, default=None, help="Défaut : 8090 (esf), 8092 (calendar)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latence ajoutée (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variation aléatoire de la latence (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Part des appels en erreur 503")
+    parser.add_argument("--quota", type=float, default=0.0,
+                        help="Appels par seconde au-delà desquels le serveur répond 403 rateLimitExceeded"
+                             " (calendar) ou 429 (esf) ; 0 = illimité")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", "-v", action="store_true")
+    # ESF
+    parser.add_argument("--items", "-n", type=int, default=5000, help="Taille du planning synthétique (esf)")
+    parser.add_argument("--instructors", type=int, default=None)
+    parser.add_argument("--identity-host", default="localhost",
+                        help="Nom d'hôte du fournisseur d'identité (différent de --host)")
+    parser.add_argument("--username", default="", help="Identifiant attendu (vide = tous acceptés)")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--session-ttl", type=int, default=3600, help="Durée de vie des sessions (s)")
+    # Calendar
+    parser.add_argument("--page-size", type=int, default=2500, help="Taille maximale des pages events.list")
+    args = parser.parse_args()
+
+    port = args.port or (8090 if args.kind == "esf" else 8092)
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.quota, args.seed)
+    options = {"page_size": args.page_size}
+    if args.kind == "esf":
+        now = datetime.now(timezone.utc)
+        season = now.year + 1 if now.month >= 5 else now.year
+        options.update(
+            items=generate_items(args.items, args.instructors, season=season, seed=args.seed or 42),
+            identity_host=args.identity_host, username=args.username, password=args.password,
+            session_ttl=args.session_ttl,
+        )
+    server = make_server(args.kind, args.host, port, faults, args.verbose, **options)
+
+    base = f"http://{args.host}:{port}"
+    print(f"Serveur {args.kind} de test sur {base}")
+    if args.kind == "esf":
+        print(f"  export ESF_HOME_URL={base}/")
+        print(f"  export ESF_IDENTITY_URL=http://{args.identity_host}:{port}/identity/")
+        print(f"  export ESF_PLANNING_URL='{base}/PlanningParticulierSSO/PlanningParticulier.aspx?NoEcole={{ecole}}'")
+        print(f"  export ESF_API_URL='{base}/PlanningParticulierSSO/AjaxProxyService.svc/InvokeMethod"
+              f"?IPlanningParticulierServicePublic&GetListeHorairesMoniteur'")
+    else:
+        print(f"  export GOOGLE_API_ENDPOINT={base}/calendar/v3/")
+        print(f"  export GOOGLE_API_BATCH_URI={base}/batch/calendar/v3")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,36 @@
-import subprocess
+import argparse
+import sys
 from pathlib import Path
 
+# Les étapes du pipeline sont des modules du dossier scripts/
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+
+from esf_pipeline import run_pipeline
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Synchronisation ESF → Google Calendar")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Écrit aussi events.json et filtered_events.json")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Synchronise en continu avec un intervalle adaptatif (voir scripts/esf_daemon.py)")
+    args = parser.parse_args()
+
     # Créer le dossier config si nécessaire
     Path("config").mkdir(exist_ok=True)
-    
-    # Exécution des étapes dans l'ordre
-    steps = [
-        "python3 scripts/recuperation_json_2402_final.py",
-        "python3 scripts/tri_json_2402_v0.py",
-        "python3 scripts/import_cal_et_gen_mail_v1.py"
-    ]
-    
-    for step in steps:
-        try:
-            subprocess.run(step, shell=True, check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Erreur lors de l'étape {step}: {e}")
-            break
+
+    if args.daemon:
+        from esf_daemon import serve
+        serve(snapshot=args.snapshot)
+        return
+
+    # Exécution des étapes dans l'ordre, dans le même processus
+    try:
+        run_pipeline(snapshot=args.snapshot)
+    except Exception as e:
+        print(f"Erreur lors du pipeline: {e}")
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
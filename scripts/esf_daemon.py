@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synchronisation en continu : le pipeline (esf_pipeline.run_pipeline) est relancé
+dans le même processus, qui garde la session HTTP ESF, ses cookies et le client
+Google Calendar d'un passage à l'autre (pas d'imports, de connexion ni de
+construction du client à chaque interrogation).
+
+L'intervalle entre deux passages s'adapte :
+  - ESF_DAEMON_INTERVAL (300 s) pendant la saison et les heures de travail ;
+  - ESF_DAEMON_OFF_HOURS_INTERVAL (1800 s) en saison hors des heures de travail ;
+  - ESF_DAEMON_OFF_SEASON_INTERVAL (21600 s) hors saison ;
+  - après ESF_DAEMON_IDLE_AFTER (3) passages sans changement, l'intervalle double
+    à chaque passage sans changement, jusqu'à ESF_DAEMON_MAX_INTERVAL (3600 s,
+    jamais moins que l'intervalle de base) ; un changement le ramène à la base ;
+  - en cas d'erreur, l'attente double à chaque échec consécutif jusqu'à
+    ESF_DAEMON_MAX_ERROR_INTERVAL (3600 s, jamais moins que l'intervalle de base) ;
+  - chaque attente varie aléatoirement de ±ESF_DAEMON_JITTER (10 %) pour ne pas
+    interroger l'ESF à heure fixe.
+Saison : ESF_DAEMON_SEASON (MM-JJ:MM-JJ, défaut 12-01:04-30) ; heures de travail :
+ESF_DAEMON_HOURS (7-20, heure de Paris).
+
+Usage : python3 main.py --daemon  (ou python3 scripts/esf_daemon.py)
+Pour ne transmettre que les changements, utiliser ESF_INCREMENTAL=diff ou delta.
+"""
+import argparse
+import logging
+import os
+import random
+import signal
+import threading
+from datetime import datetime
+
+import run_metrics
+from esf_dates import TIMEZONE_PARIS
+
+INTERVAL = float(os.getenv("ESF_DAEMON_INTERVAL", "300"))
+OFF_HOURS_INTERVAL = float(os.getenv("ESF_DAEMON_OFF_HOURS_INTERVAL", "1800"))
+OFF_SEASON_INTERVAL = float(os.getenv("ESF_DAEMON_OFF_SEASON_INTERVAL", "21600"))
+MAX_INTERVAL = float(os.getenv("ESF_DAEMON_MAX_INTERVAL", "3600"))
+MAX_ERROR_INTERVAL = float(os.getenv("ESF_DAEMON_MAX_ERROR_INTERVAL", "3600"))
+IDLE_AFTER = int(os.getenv("ESF_DAEMON_IDLE_AFTER", "3"))
+JITTER = float(os.getenv("ESF_DAEMON_JITTER", "0.1"))
+SEASON = os.getenv("ESF_DAEMON_SEASON", "12-01:04-30")
+HOURS = os.getenv("ESF_DAEMON_HOURS", "7-20")
+
+
+def parse_season(value=SEASON):
+    """"MM-JJ:MM-JJ" -> ((mois, jour), (mois, jour))"""
+    start, end = value.split(":")
+    return tuple(tuple(int(part) for part in bound.split("-")) for bound in (start, end))
+
+
+def parse_hours(value=HOURS):
+    """"7-20" -> (7, 20) : de 7h à 20h (exclu)"""
+    start, end = value.split("-")
+    return int(start), int(end)
+
+
+def in_season(now, season=None):
+    """Vrai si la date (heure de Paris) est dans la saison ; la saison peut chevaucher le 1er janvier"""
+    start, end = season or parse_season()
+    day = (now.month, now.day)
+    if start <= end:
+        return start <= day <= end
+    return day >= start or day <= end
+
+
+def in_working_hours(now, hours=None):
+    start, end = hours or parse_hours()
+    return start <= now.hour < end
+
+
+def base_interval(now, season=None, hours=None):
+    """Intervalle entre deux passages selon la saison et l'heure"""
+    now = now.astimezone(TIMEZONE_PARIS)
+    if not in_season(now, season):
+        return OFF_SEASON_INTERVAL
+    if not in_working_hours(now, hours):
+        return OFF_HOURS_INTERVAL
+    return INTERVAL
+
+
+def next_delay(now, idle_polls=0, errors=0, rng=random):
+    """
+    Attente avant le prochain passage : intervalle de base, allongé après plusieurs
+    passages sans changement ou après des erreurs consécutives, avec jitter.
+    """
+    delay = base_interval(now)
+    # Les plafonds ne raccourcissent jamais l'intervalle de base (hors saison : 6 h)
+    if errors:
+        delay = max(delay, min(MAX_ERROR_INTERVAL, delay * 2 ** errors))
+    elif idle_polls >= IDLE_AFTER:
+        delay = max(delay, min(MAX_INTERVAL, delay * 2 ** (idle_polls - IDLE_AFTER + 1)))
+    return delay * rng.uniform(1 - JITTER, 1 + JITTER)
+
+
+class SyncDaemon:
+    """Boucle de synchronisation ; stop() interrompt l'attente en cours"""
+
+    def __init__(self, snapshot=False, rng=random):
+        self.snapshot = snapshot
+        self.rng = rng
+        self.stopping = threading.Event()
+        self.idle_polls = 0
+        self.errors = 0
+        self.polls = 0
+
+    def poll(self):
+        """Un passage du pipeline ; retourne le nombre de changements envoyés au calendrier"""
+        # Import local : le pipeline charge ses étapes à la demande
+        from esf_pipeline import run_pipeline
+
+        if run_pipeline(snapshot=self.snapshot) is None:
+            raise RuntimeError("échec de la récupération ESF")
+        totals = run_metrics.current().totals
+        return sum(totals.get(key, 0) for key in ("diff.inserts", "diff.patches", "diff.deletes"))
+
+    def run_once(self):
+        """Exécute un passage et met à jour les compteurs ; retourne l'attente avant le suivant"""
+        self.polls += 1
+        try:
+            changes = self.poll()
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Passage {self.polls} en échec ({self.errors} consécutif(s)) : {e}")
+        else:
+            self.errors = 0
+            self.idle_polls = 0 if changes else self.idle_polls + 1
+            logging.info(f"Passage {self.polls} : {changes} changement(s) envoyé(s) au calendrier")
+        return next_delay(datetime.now(TIMEZONE_PARIS), self.idle_polls, self.errors, self.rng)
+
+    def run(self):
+        while not self.stopping.is_set():
+            delay = self.run_once()
+            logging.info(f"Prochain passage dans {delay / 60:.1f} min")
+            self.stopping.wait(delay)
+
+    def stop(self, *_):
+        logging.info("Arrêt demandé, fin après le passage en cours")
+        self.stopping.set()
+
+
+def serve(snapshot=False):
+    """Lance la boucle jusqu'à SIGTERM / Ctrl+C"""
+    logging.basicConfig(level=os.getenv("ESF_LOG_LEVEL", "INFO").upper(),
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    daemon = SyncDaemon(snapshot=snapshot)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+    return daemon
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Synchronisation ESF → Google Calendar en continu")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Écrit aussi events.json et filtered_events.json à chaque passage")
+    args = parser.parse_args()
+    serve(args.snapshot)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
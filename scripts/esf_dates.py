@@ -0,0 +1,90 @@
+"""
+Codec des dates ESF au format /Date(ms±hhmm)/ partagé par tous les convertisseurs
+(Google Calendar, ICS, filtres).
+L'expression régulière est compilée une fois, le fuseau Europe/Paris est créé une
+fois, et les valeurs répétées (ServerTime, dm identiques...) sont servies par un
+cache LRU. parse_column() convertit une colonne entière (dd, df, dm) d'un coup,
+en tableau NumPy datetime64 lorsque NumPy est disponible.
+"""
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+try:
+    import numpy as np
+except ImportError:  # NumPy est optionnel
+    np = None
+
+ESF_DATE_RE = re.compile(r"/Date\((-?\d+)([+-]\d{4})?\)/")
+
+# zoneinfo plutôt que pytz : le fuseau est lu à la demande, sans coût à l'import
+TIMEZONE_PARIS = ZoneInfo("Europe/Paris")
+
+CACHE_SIZE = 8192
+
+
+def _match(esf_date):
+    match = ESF_DATE_RE.match(esf_date) if isinstance(esf_date, str) else None
+    if not match:
+        raise ValueError(f"Format de date ESF invalide : {esf_date}")
+    return match
+
+
+def to_epoch_ms(esf_date):
+    """Timestamp en millisecondes (l'offset ne change pas l'instant)"""
+    return int(_match(esf_date).group(1))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse(esf_date):
+    """
+    Convertit une date ESF en datetime Europe/Paris (précision à la seconde).
+    Lève ValueError si le format est invalide.
+    """
+    timestamp_ms = int(_match(esf_date).group(1))
+    return datetime.fromtimestamp(timestamp_ms // 1000, tz=timezone.utc).astimezone(TIMEZONE_PARIS)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_french(esf_date):
+    """
+    Date ESF formatée pour l'affichage ("%d/%m/%Y %H:%M:%S").
+    Conserve le comportement historique des descriptions : les heures de
+    l'offset sont ajoutées à l'instant UTC avant la conversion en heure de Paris.
+    """
+    match = _match(esf_date)
+    timestamp_sec = int(match.group(1)) // 1000
+    offset_hours = int((match.group(2) or "+0000")[:3])
+    date_adjusted = datetime.fromtimestamp(timestamp_sec + offset_hours * 3600, tz=timezone.utc)
+    return date_adjusted.astimezone(TIMEZONE_PARIS).strftime("%d/%m/%Y %H:%M:%S")
+
+
+def parse_column(values):
+    """
+    Convertit une colonne de dates ESF en une seule passe.
+    Retourne un tableau NumPy datetime64[ms] (UTC) si NumPy est disponible,
+    sinon une liste de timestamps en millisecondes. Les valeurs invalides
+    donnent NaT (NumPy) ou None.
+    """
+    match = ESF_DATE_RE.match
+    ms = []
+    for value in values:
+        m = match(value) if isinstance(value, str) else None
+        ms.append(int(m.group(1)) if m else None)
+    if np is None:
+        return ms
+    return np.array(
+        [v if v is not None else np.datetime64("NaT") for v in ms], dtype="datetime64[ms]"
+    )
+
+
+def parse_columns(items, fields=("dd", "df", "dm")):
+    """Convertit les colonnes fields d'une liste d'événements ESF : {champ: colonne}"""
+    return {field: parse_column([item.get(field) for item in items]) for field in fields}
+
+
+def format_esf_date(dt):
+    """Datetime aware -> /Date(ms+0000)/"""
+    return f"/Date({int(dt.timestamp() * 1000)}+0000)/"
+
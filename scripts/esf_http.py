@@ -0,0 +1,107 @@
+"""
+Client HTTP direct pour l'API planning ESF (AjaxProxyService.svc).
+Les cookies proviennent de la session Playwright sauvegardée (esf_session) ;
+le navigateur n'est plus nécessaire que pour renouveler ces cookies.
+"""
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import run_metrics
+
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
+)
+
+# Session HTTP partagée : les connexions TLS sont conservées entre les appels
+_http_session = None
+
+
+class SessionExpired(Exception):
+    """Le serveur ESF a refusé les cookies de session"""
+
+
+def get_http_session(pool_size=10):
+    """Retourne la session HTTP partagée (pool de connexions keep-alive)"""
+    global _http_session
+    if _http_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"User-Agent": USER_AGENT})
+        _http_session = session
+    return _http_session
+
+
+def load_cookies(session, storage_state):
+    """Copie les cookies d'un storage_state Playwright dans la session HTTP"""
+    session.cookies.clear()
+    for cookie in storage_state.get("cookies", []):
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain"),
+            path=cookie.get("path", "/"),
+            secure=cookie.get("secure", False),
+            expires=int(cookie["expires"]) if cookie.get("expires", -1) > 0 else None,
+        )
+
+
+def dump_cookies(session, storage_state):
+    """
+    Retourne storage_state mis à jour avec les cookies de la session HTTP
+    (ceux que le serveur a renouvelés ou ajoutés pendant les requêtes).
+    """
+    known = {(c["name"], c.get("domain"), c.get("path", "/")): c for c in storage_state.get("cookies", [])}
+    cookies = []
+    for cookie in session.cookies:
+        previous = known.get((cookie.name, cookie.domain, cookie.path))
+        if previous and previous["value"] == cookie.value:
+            cookies.append(previous)
+            continue
+        cookies.append({
+            "httpOnly": False,
+            "sameSite": "Lax",
+            **(previous or {}),
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path,
+            "secure": bool(cookie.secure),
+            "expires": cookie.expires if cookie.expires is not None else -1,
+        })
+    return {**storage_state, "cookies": cookies}
+
+
+def post_planning(api_url, payload, referer, timeout=30):
+    """
+    Envoie la requête GetListeHorairesMoniteur et retourne le JSON décodé.
+    Lève SessionExpired si le serveur redirige vers la page de connexion.
+    """
+    session = get_http_session()
+    response = session.post(
+        api_url,
+        data=json.dumps(payload),
+        headers={
+            "Content-Type": "application/json",
+            "X-Requested-With": "XMLHttpRequest",
+            "Referer": referer,
+        },
+        timeout=timeout,
+        allow_redirects=False,
+    )
+
+    if response.status_code in (301, 302, 303, 401, 403):
+        raise SessionExpired(f"Réponse {response.status_code} de {api_url}")
+    response.raise_for_status()
+    run_metrics.count("requests")
+    run_metrics.count("bytes_in", len(response.content))
+
+    try:
+        return response.json()
+    except ValueError as e:
+        # Une page HTML à la place du JSON = page de connexion
+        raise SessionExpired(f"Réponse non JSON de {api_url}") from e
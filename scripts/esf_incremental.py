@@ -0,0 +1,112 @@
+"""
+Récupération incrémentale du planning ESF.
+On mémorise le dernier ServerTime et la date de modification (dm) de chaque
+événement connu, afin de ne transmettre aux étapes suivantes que les événements
+nouveaux ou modifiés.
+
+Modes (variable ESF_INCREMENTAL) :
+  - "off"   : tout le planning est transmis (comportement historique)
+  - "diff"  : récupération complète, puis comparaison locale sur dm
+  - "delta" : l'ESF ne renvoie que les changements depuis le dernier ServerTime
+              (champ dateReferenceDelta), repli sur "diff" au premier passage
+"""
+import json
+import os
+
+import esf_dates
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin racine
+
+INCREMENTAL = os.getenv("ESF_INCREMENTAL", "off")
+STATE_FILE = os.getenv("ESF_FETCH_STATE_FILE", os.path.join(BASE_DIR, "config", "esf_fetch_state.json"))
+
+
+def load_fetch_state(path=STATE_FILE):
+    """Retourne {"ServerTime": ..., "items": {ih: dm}, "starts": {ih: début en ms}} (vide au premier passage)"""
+    if not os.path.exists(path):
+        return {"ServerTime": None, "items": {}, "starts": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_fetch_state(state, path=STATE_FILE):
+    """Écrit l'état de manière atomique (pas de fichier tronqué en cas d'arrêt)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _start_ms(item):
+    """Début du cours (epoch ms), None si dd est absent ou invalide"""
+    try:
+        return esf_dates.to_epoch_ms(item.get("dd"))
+    except ValueError:
+        return None
+
+
+def select_changes(data, state, mode=INCREMENTAL):
+    """
+    Ne garde dans data["Items"] que les événements nouveaux ou modifiés.
+    Retourne (données réduites, nouvel état à sauvegarder une fois l'import réussi).
+    En mode "diff", les ih disparus sont listés dans data["Removed"] : seulement ceux
+    dont le début est dans la période demandée (DateDebut/DateFin), car l'ESF ne
+    renvoie pas les cours déjà commencés, et jamais si la réponse est incomplète.
+    """
+    known = state.get("items", {})
+    starts = state.get("starts", {})
+    items = data.get("Items", [])
+
+    changed = [item for item in items if known.get(str(item["ih"])) != item.get("dm")]
+    fetched = {str(item["ih"]): item.get("dm") for item in items}
+    fetched_starts = {str(item["ih"]): _start_ms(item) for item in items}
+
+    if (mode == "delta" and state.get("ServerTime")) or data.get("Incomplete"):
+        # Réponse partielle : on ne peut pas savoir quels événements ont disparu
+        new_known = {**known, **fetched}
+        new_starts = {**starts, **fetched_starts}
+        removed = []
+    else:
+        new_known = fetched
+        new_starts = fetched_starts
+        low = _start_ms({"dd": data.get("DateDebut")})
+        high = _start_ms({"dd": data.get("DateFin")})
+        # Sans période connue (ou sans début mémorisé), rien n'est supprimé
+        removed = [
+            ih for ih in known
+            if ih not in new_known and low is not None and starts.get(ih) is not None
+            and low <= starts[ih] and (high is None or starts[ih] < high)
+        ]
+
+    print(f"{len(changed)} événements nouveaux ou modifiés, {len(removed)} disparus "
+          f"(sur {len(items)} récupérés)")
+
+    result = {
+        **data,
+        "Total": len(changed),
+        "Items": changed,
+        "Incremental": True,
+        "Removed": removed,
+    }
+    new_state = {"ServerTime": data.get("ServerTime"), "items": new_known, "starts": new_starts}
+    return result, new_state
+
+
+def forget_failed(new_state, old_state, failed):
+    """
+    Remet dans new_state l'entrée de old_state des ih dont l'import a échoué :
+    un ajout ou une mise à jour ratée sera vue comme changée au prochain passage,
+    une suppression ratée comme disparue.
+    """
+    restored = {**new_state}
+    for key in ("items", "starts"):
+        entries = dict(new_state.get(key, {}))
+        previous = old_state.get(key, {})
+        for ih in map(str, failed):
+            if ih in previous:
+                entries[ih] = previous[ih]
+            else:
+                entries.pop(ih, None)
+        restored[key] = entries
+    return restored
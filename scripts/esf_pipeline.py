@@ -0,0 +1,106 @@
+"""
+Pipeline ESF en un seul processus : récupération → filtrage → import Google Calendar.
+Les événements passent d'une étape à l'autre en mémoire ; les fichiers JSON
+intermédiaires (events.json / filtered_events.json) ne sont écrits que sur demande.
+"""
+import json
+import os
+
+import run_metrics
+from esf_incremental import INCREMENTAL, forget_failed, load_fetch_state, save_fetch_state, select_changes
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin racine
+
+EVENTS_FILE = os.path.join(BASE_DIR, "events.json")
+FILTERED_FILE = os.path.join(BASE_DIR, "filtered_events.json")
+
+
+def save_snapshot(data, path):
+    """Sauvegarde une copie compacte d'une étape du pipeline"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def fetch_step(incremental=INCREMENTAL):
+    """
+    Étape 1 : récupération du planning ESF.
+    Retourne (données, état incrémental à sauvegarder après l'import ou None).
+    """
+    # Import local : Playwright n'est chargé que si l'étape est exécutée
+    from recuperation_json_2402_final import get_esf_events
+
+    if incremental == "off":
+        return get_esf_events(), None
+
+    state = load_fetch_state()
+    reference_delta = state.get("ServerTime") if incremental == "delta" else None
+    data = get_esf_events(reference_delta=reference_delta)
+    if not data:
+        return data, None
+    return select_changes(data, state, incremental)
+
+
+def filter_step(data):
+    """Étape 2 : filtrage (par défaut suppression des absences)"""
+    from tri_json_2402_v0 import filter_events, get_rules
+    rules = get_rules()
+    filtered = filter_events(data, rules)
+    rules.report()
+    return filtered
+
+
+def import_step(data, service=None):
+    """
+    Étape 3 : import des nouveaux événements dans Google Calendar.
+    Retourne la liste des ih dont l'écriture a échoué.
+    """
+    from import_cal_et_gen_mail_v1 import import_events
+    return import_events(data, service)
+
+
+def run_pipeline(snapshot=False):
+    """
+    Exécute les trois étapes dans le processus courant.
+    Si snapshot est vrai, les résultats intermédiaires sont aussi écrits sur disque.
+    Retourne le dict filtré, ou None si la récupération a échoué.
+    Le rapport de mesures (run_metrics) est exporté à la fin, même en cas d'erreur.
+    """
+    run_metrics.start("esf_sync")
+    try:
+        return _run_steps(snapshot)
+    finally:
+        run_metrics.export()
+
+
+def _run_steps(snapshot):
+    with run_metrics.stage("fetch"):
+        data, fetch_state = fetch_step()
+        run_metrics.count("items", len(data.get("Items", [])) if data else 0)
+    if not data:
+        print("Échec de la récupération, import annulé")
+        run_metrics.current().failed = True
+        return None
+    if snapshot:
+        save_snapshot(data, EVENTS_FILE)
+
+    with run_metrics.stage("filter"):
+        filtered = filter_step(data)
+        run_metrics.count("items_in", len(data.get("Items", [])))
+        run_metrics.count("items", filtered["Total"])
+    print(f"{filtered['Total']} éléments conservés après filtrage")
+    if snapshot:
+        save_snapshot(filtered, FILTERED_FILE)
+
+    if filtered.get("Incremental") and not filtered["Items"] and not filtered.get("Removed"):
+        print("Aucun changement depuis le dernier passage, import ignoré")
+    else:
+        failed = import_step(filtered) or []
+        if failed and fetch_state is not None:
+            print(f"{len(failed)} écriture(s) en échec, retransmises au prochain passage")
+            fetch_state = forget_failed(fetch_state, load_fetch_state(), failed)
+
+    # L'état n'est mémorisé qu'une fois l'import terminé : en cas d'échec de l'import
+    # ou d'un événement, les mêmes changements seront retransmis au prochain passage
+    if fetch_state is not None:
+        save_fetch_state(fetch_state)
+    return filtered
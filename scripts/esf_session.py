@@ -0,0 +1,107 @@
+"""
+Gestion de la session ESF authentifiée.
+Le storage_state Playwright (cookies + localStorage) est sauvegardé après chaque
+connexion et réutilisé aux exécutions suivantes : la connexion complète sur
+identity.w-esf.com n'est rejouée que lorsque la session a expiré.
+"""
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin racine
+
+SESSION_FILE = os.getenv("ESF_SESSION_FILE", os.path.join(BASE_DIR, "config", "esf_session.json"))
+
+# Adresses du site ESF et du fournisseur d'identité (modifiables pour les serveurs de test locaux)
+ESF_HOME_URL = os.getenv("ESF_HOME_URL", "https://carnet-rouge-esf.app/")
+ESF_IDENTITY_URL = os.getenv("ESF_IDENTITY_URL", "https://identity.w-esf.com/")
+LOGIN_LINK = 'a[title="Connexion"]'
+
+
+def load_storage_state(path=SESSION_FILE):
+    """Charge le storage_state sauvegardé, ou None s'il est absent, illisible ou expiré"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Session ESF illisible ({e}), reconnexion nécessaire")
+        return None
+
+    # Vérification hors-ligne : si tous les cookies persistants ont expiré,
+    # inutile de tester la session côté serveur
+    now = time.time()
+    cookies = state.get("cookies", [])
+    if cookies and all(0 < c.get("expires", -1) < now for c in cookies):
+        print("Session ESF expirée")
+        return None
+    return state
+
+
+def write_storage_state(state, path=SESSION_FILE):
+    """Écrit un storage_state sur disque (lisible par l'utilisateur seul)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    return state
+
+
+def save_storage_state(context, path=SESSION_FILE):
+    """Sauvegarde les cookies de la session courante"""
+    return write_storage_state(context.storage_state(), path)
+
+
+def clear_storage_state(path=SESSION_FILE):
+    """Supprime la session sauvegardée (ex : après un refus du serveur)"""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def login(page, username, password):
+    """Connexion complète via le fournisseur d'identité ESF"""
+    print("Navigating to login page...")
+    page.goto(ESF_HOME_URL)
+    page.click(LOGIN_LINK)
+    page.wait_for_url(f"{ESF_IDENTITY_URL}**")
+    page.fill("#LoginVM_Login", username)
+    page.fill("#LoginVM_MotDePasse", password)
+    page.click('button[type="submit"]')
+    page.wait_for_url(f"{ESF_HOME_URL}**")
+    print("Logged in successfully.")
+
+
+def is_logged_in(page):
+    """Vérifie côté serveur que la session est toujours valide"""
+    page.goto(ESF_HOME_URL)
+    # Le lien "Connexion" n'est affiché qu'aux visiteurs non authentifiés
+    return page.locator(LOGIN_LINK).count() == 0
+
+
+def open_session(browser, username, password, path=SESSION_FILE):
+    """
+    Retourne un couple (context, page) authentifié.
+    La session sauvegardée est réutilisée si elle est encore valide,
+    sinon une connexion complète est effectuée puis sauvegardée.
+    """
+    state = load_storage_state(path)
+    if state:
+        context = browser.new_context(storage_state=state)
+        page = context.new_page()
+        if is_logged_in(page):
+            print("Session ESF réutilisée.")
+            return context, page
+        print("Session ESF refusée par le serveur, reconnexion...")
+        context.close()
+        clear_storage_state(path)
+
+    context = browser.new_context()
+    page = context.new_page()
+    login(page, username, password)
+    save_storage_state(context, path)
+    return context, page
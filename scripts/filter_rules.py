@@ -0,0 +1,121 @@
+"""
+Règles de filtrage déclaratives pour le planning ESF.
+
+Fichier de règles (JSON) :
+{
+    "include": [
+        {"field": "im", "in": [19358136]},
+        {"field": "dd", "from": "2025-03-01", "to": "2025-04-30"}
+    ],
+    "exclude": [
+        {"name": "absences", "field": "cp", "in": ["ABSENT", "ABSENCEMONO"]},
+        {"field": "llr", "contains": "CHARMIEUX"}
+    ]
+}
+
+Un élément est conservé s'il vérifie toutes les règles "include" et aucune règle
+"exclude". Les règles sont compilées une seule fois en fonctions (recherche dans
+un set, bornes de dates converties en millisecondes) puis appliquées en une passe.
+"""
+import json
+from datetime import datetime, timedelta
+
+from esf_dates import ESF_DATE_RE, TIMEZONE_PARIS
+
+# Champs au format /Date(ms±hhmm)/
+DATE_FIELDS = {"dd", "df", "dm"}
+
+DEFAULT_RULES = {
+    "include": [],
+    "exclude": [
+        {"name": "cp absences", "field": "cp", "in": ["ABSENT", "ABSENCEMONO"]},
+        {"name": "lp absences", "field": "lp", "in": ["ABSENT", "ABSENCE MONO"]},
+    ],
+}
+
+
+def _to_ms(value, end_of_day=False):
+    """Convertit une date ISO (heure de Paris si non précisée) en millisecondes epoch"""
+    dt = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        # "to": "2025-04-30" inclut toute la journée du 30
+        dt += timedelta(days=1)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=TIMEZONE_PARIS)
+    return int(dt.timestamp() * 1000)
+
+
+def _compile_rule(rule):
+    """Transforme une règle en prédicat item -> bool"""
+    field = rule["field"]
+
+    if "in" in rule:
+        # Les identifiants peuvent être écrits en nombre ou en texte dans la règle
+        values = set()
+        for v in rule["in"]:
+            values.add(v)
+            values.add(str(v))
+            if isinstance(v, str) and v.isdigit():
+                values.add(int(v))
+        return lambda item: item.get(field) in values
+
+    if "contains" in rule:
+        needle = rule["contains"].upper()
+        return lambda item: needle in str(item.get(field) or "").upper()
+
+    if "from" in rule or "to" in rule:
+        if field not in DATE_FIELDS:
+            raise ValueError(f"Bornes de dates sur un champ non daté : {field}")
+        low = _to_ms(rule["from"]) if "from" in rule else None
+        high = _to_ms(rule["to"], end_of_day=True) if "to" in rule else None
+
+        def in_range(item):
+            match = ESF_DATE_RE.match(item.get(field) or "")
+            if not match:
+                return False
+            ms = int(match.group(1))
+            return (low is None or ms >= low) and (high is None or ms < high)
+        return in_range
+
+    raise ValueError(f"Règle sans condition (in, contains, from/to) : {rule}")
+
+
+class CompiledRules:
+    """Prédicat compilé ; compte le nombre d'éléments vérifiant chaque règle"""
+
+    def __init__(self, spec):
+        self.include = []
+        self.exclude = []
+        for kind, target in (("include", self.include), ("exclude", self.exclude)):
+            for i, rule in enumerate(spec.get(kind, [])):
+                name = rule.get("name") or f"{kind}[{i}] {rule['field']}"
+                target.append((name, _compile_rule(rule)))
+        self.counts = {name: 0 for name, _ in self.include + self.exclude}
+
+    def __call__(self, item):
+        counts = self.counts
+        keep = True
+        # Toutes les règles sont évaluées pour que les compteurs soient exacts
+        for name, predicate in self.include:
+            if predicate(item):
+                counts[name] += 1
+            else:
+                keep = False
+        for name, predicate in self.exclude:
+            if predicate(item):
+                counts[name] += 1
+                keep = False
+        return keep
+
+    def report(self):
+        """Affiche le nombre d'éléments vérifiant chaque règle"""
+        for name, count in self.counts.items():
+            print(f"  règle {name} : {count} éléments")
+
+
+def load_rules(path=None):
+    """Charge et compile un fichier de règles (règles par défaut : exclusion des absences)"""
+    if not path:
+        return CompiledRules(DEFAULT_RULES)
+    with open(path, "r", encoding="utf-8") as f:
+        return CompiledRules(json.load(f))
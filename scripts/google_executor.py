@@ -0,0 +1,209 @@
+"""
+Exécution des appels Google Calendar : pool de threads borné, limiteur de débit
+(token bucket calé sur le quota du projet), nouvelles tentatives avec backoff
+exponentiel et jitter sur 403 rateLimitExceeded / 429 / 5xx, et métriques par appel
+(dont les octets reçus, comptés par le client HTTP de chaque thread).
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Nombre d'appels simultanés
+MAX_WORKERS = int(os.getenv("GOOGLE_API_MAX_WORKERS", "4"))
+# Débit autorisé (requêtes/seconde) : quota Calendar par défaut = 600 requêtes/minute/utilisateur
+RATE = float(os.getenv("GOOGLE_API_RATE", "10"))
+MAX_RETRIES = int(os.getenv("GOOGLE_API_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+
+RETRIABLE_STATUS = {429, 500, 502, 503, 504}
+RETRIABLE_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+
+
+def error_status(error):
+    """Code HTTP d'une HttpError (None pour les autres exceptions)"""
+    return getattr(getattr(error, "resp", None), "status", None)
+
+
+def is_retriable(error):
+    """Vrai si l'erreur est temporaire (quota, surcharge, réseau)"""
+    status = error_status(error)
+    if status in RETRIABLE_STATUS:
+        return True
+    if status == 403:
+        content = getattr(error, "content", b"") or b""
+        return any(reason in content for reason in RETRIABLE_REASONS)
+    # Erreurs réseau (connexion coupée, délai dépassé...)
+    return status is None and isinstance(error, (OSError, TimeoutError))
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Backoff exponentiel avec jitter complet"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Limiteur de débit partagé entre les threads"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Attend que le débit permette tokens requêtes ; retourne le temps d'attente"""
+        waited = 0.0
+        # Un lot plus gros que la capacité part dès que le seau est plein,
+        # le solde négatif retarde ensuite les appels suivants
+        needed = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return waited
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class ApiMetrics:
+    """Durée (hors attente), temps d'attente (débit + backoff), tentatives et résultat de chaque appel"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def record(self, label, duration, throttled, attempts, status, bytes_in=0):
+        with self.lock:
+            self.calls.append({
+                "label": label, "duration": duration, "throttled": throttled,
+                "attempts": attempts, "status": status, "bytes_in": bytes_in,
+            })
+
+    def summary(self, since=0):
+        """Résumé des appels enregistrés à partir de l'indice since"""
+        with self.lock:
+            calls = self.calls[since:]
+        durations = sorted(c["duration"] for c in calls)
+        return {
+            "calls": len(calls),
+            "retries": sum(c["attempts"] - 1 for c in calls),
+            "errors": sum(1 for c in calls if c["status"] != "ok"),
+            "total_time": round(sum(durations), 3),
+            "throttled": round(sum(c["throttled"] for c in calls), 3),
+            "bytes_in": sum(c["bytes_in"] for c in calls),
+            "p50": round(durations[len(durations) // 2], 3) if durations else 0,
+            "max": round(durations[-1], 3) if durations else 0,
+        }
+
+
+class CountingHttp:
+    """Client HTTP (httplib2 ou AuthorizedHttp) qui compte les octets des réponses reçues"""
+
+    def __init__(self, http):
+        self.http = http
+        self.bytes_in = 0
+
+    def request(self, *args, **kwargs):
+        response, content = self.http.request(*args, **kwargs)
+        self.bytes_in += len(content or b"")
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+class ApiExecutor:
+    """
+    Exécute des appels API avec limitation de débit et nouvelles tentatives.
+    http_factory crée un client HTTP par thread (httplib2 n'est pas thread-safe) ;
+    sans factory, les appels restent séquentiels.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, rate=RATE, max_retries=MAX_RETRIES, http_factory=None):
+        self.max_workers = max_workers if http_factory else 1
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+        self.metrics = ApiMetrics()
+        self.http_factory = http_factory
+        self.local = threading.local()
+
+    def http(self):
+        """Client HTTP propre au thread courant (None = client par défaut du service)"""
+        if self.http_factory is None:
+            return None
+        if not hasattr(self.local, "http"):
+            self.local.http = self.http_factory()
+        return self.local.http
+
+    def call(self, fn, cost=1, label=""):
+        """
+        Exécute fn(http) en respectant le débit ; les erreurs temporaires sont
+        retentées jusqu'à max_retries fois. cost = nombre de requêtes consommées
+        sur le quota (taille d'un lot batch).
+        """
+        duration = 0.0
+        throttled = 0.0
+        http = self.http()
+        # Client propre au thread : la différence du compteur est celle de cet appel
+        received = getattr(http, "bytes_in", 0)
+        for attempt in range(self.max_retries + 1):
+            throttled += self.bucket.acquire(cost)
+            start = time.monotonic()
+            try:
+                result = fn(http)
+            except Exception as e:
+                duration += time.monotonic() - start
+                if attempt == self.max_retries or not is_retriable(e):
+                    status = error_status(e) or type(e).__name__
+                    self.metrics.record(label, duration, throttled, attempt + 1, status,
+                                        getattr(http, "bytes_in", 0) - received)
+                    raise
+                delay = backoff_delay(attempt)
+                throttled += delay
+                time.sleep(delay)
+                continue
+            duration += time.monotonic() - start
+            self.metrics.record(label, duration, throttled, attempt + 1, "ok",
+                                getattr(http, "bytes_in", 0) - received)
+            return result
+
+    def execute(self, request, label=""):
+        """Exécute une requête googleapiclient"""
+        return self.call(lambda http: request.execute(http=http), label=label)
+
+    def map(self, fn, items, cost=lambda item: 1, label=""):
+        """
+        Applique fn(item, http) à chaque élément dans le pool de threads.
+        Retourne une liste de (résultat, exception) dans l'ordre des éléments.
+        """
+        def run(item):
+            try:
+                return self.call(lambda http: fn(item, http), cost(item), label), None
+            except Exception as e:
+                return None, e
+
+        if self.max_workers <= 1 or len(items) <= 1:
+            return [run(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(run, items))
+
+
+def get_executor(service, **kwargs):
+    """Crée un exécuteur avec un client HTTP authentifié par thread"""
+    credentials = getattr(getattr(service, "_http", None), "credentials", None)
+    http_factory = None
+    if credentials is not None:
+        import httplib2
+        import google_auth_httplib2
+
+        def http_factory():
+            return CountingHttp(google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=60)))
+    return ApiExecutor(http_factory=http_factory, **kwargs)
@@ -0,0 +1,69 @@
+"""
+Cache des VEVENT déjà rendus, indexé par (ih, dm).
+Un cours dont la date de modification ESF (dm) n'a pas changé n'est pas
+reconverti : son fragment (octets pliés, CRLF) est recopié tel quel.
+La date de création (CREATED) est celle de la première version rencontrée.
+"""
+import json
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin racine
+
+FRAGMENTS_FILE = os.getenv("ESF_ICS_FRAGMENTS", os.path.join(BASE_DIR, "config", "ics_fragments.json"))
+
+# À incrémenter quand le rendu d'un VEVENT change : les fragments en cache sont alors ignorés
+RENDER_VERSION = 2
+
+
+class FragmentCache:
+    """{ih: [dm, created, fragment]} chargé depuis / sauvegardé dans un fichier JSON"""
+
+    def __init__(self, path=FRAGMENTS_FILE, version=RENDER_VERSION):
+        self.path = path
+        self.version = version
+        self.events = {}
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == version:
+                self.events = data.get("events", {})
+
+    def get(self, ih, dm):
+        """Fragment rendu pour cette version du cours (None s'il faut le reconvertir)"""
+        ih = str(ih)
+        self.seen.add(ih)
+        entry = self.events.get(ih)
+        if entry and entry[0] == dm:
+            self.hits += 1
+            return entry[2].encode("utf-8")
+        self.misses += 1
+        return None
+
+    def created(self, ih, default):
+        """Date CREATED conservée de la première version du cours"""
+        entry = self.events.get(str(ih))
+        return entry[1] if entry else default
+
+    def put(self, ih, dm, created, fragment):
+        self.events[str(ih)] = [dm, created, fragment.decode("utf-8")]
+
+    def prune(self):
+        """Oublie les cours absents du dernier rendu ; retourne leur nombre"""
+        stale = [ih for ih in self.events if ih not in self.seen]
+        for ih in stale:
+            del self.events[ih]
+        return len(stale)
+
+    def save(self):
+        """Écrit le cache de manière atomique"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "events": self.events}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
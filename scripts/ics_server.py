@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serveur d'abonnement aux calendriers ICS générés (json_to_ics_generator.py).
+
+Chaque fichier *.ics du dossier servi est publié à l'adresse /<nom>.ics.
+Les flux sont gardés en mémoire, déjà compressés (gzip, et brotli si le module
+est installé), avec un ETag fort (SHA-256 du contenu) et Last-Modified.
+Les clients qui renvoient If-None-Match / If-Modified-Since reçoivent un
+304 Not Modified sans corps. Un thread surveille les fichiers : un flux
+régénéré est rechargé puis remplacé d'un bloc (les requêtes en cours
+continuent de servir l'ancienne version).
+
+Usage : python3 scripts/ics_server.py [--dir .] [--host 127.0.0.1] [--port 8080]
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin racine
+
+ICS_DIR = os.getenv("ESF_ICS_DIR", BASE_DIR)
+HOST = os.getenv("ESF_ICS_HOST", "127.0.0.1")
+PORT = int(os.getenv("ESF_ICS_PORT", "8080"))
+# Intervalle de surveillance des fichiers (secondes)
+RELOAD_INTERVAL = float(os.getenv("ESF_ICS_RELOAD_INTERVAL", "5"))
+# Durée pendant laquelle un client peut réutiliser sa copie sans revalider
+MAX_AGE = int(os.getenv("ESF_ICS_MAX_AGE", "300"))
+
+CONTENT_TYPE = "text/calendar; charset=utf-8"
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class Feed:
+    """Un calendrier en mémoire : corps brut et compressés, ETag et date de modification"""
+
+    def __init__(self, body, mtime):
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.mtime = int(mtime)
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        # Une représentation par encodage, chacune avec son ETag fort
+        self.variants = {"identity": body}
+        # mtime=0 : même contenu, mêmes octets compressés
+        self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body)
+
+    def etag(self, encoding):
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.digest[:32]}{suffix}"'
+
+    def matches(self, if_none_match):
+        """Vrai si If-None-Match désigne ce contenu (quel que soit l'encodage)"""
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag.strip('"').split("-")[0] == self.digest[:32]:
+                return True
+        return False
+
+    def modified_since(self, if_modified_since):
+        try:
+            return self.mtime > parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return True
+
+
+def choose_encoding(accept_encoding, available):
+    """Encodage préféré par le client parmi available (br > gzip > identity à q égal)"""
+    preference = ("br", "gzip", "identity")
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = "identity", weights.get("identity", weights.get("*", 1.0) if weights else 1.0)
+    for name in preference:
+        if name not in available or name == "identity":
+            continue
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > 0 and q >= best_q:
+            return name
+    return best
+
+
+class FeedStore:
+    """Flux servis, rechargés lorsque le fichier correspondant change sur disque"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.feeds = {}
+        self.signatures = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        return self.feeds.get(name)
+
+    def reload(self):
+        """Recharge les fichiers .ics nouveaux ou modifiés ; retourne le nombre de flux rechargés"""
+        reloaded = 0
+        present = set()
+        with self.lock:
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".ics") or not entry.is_file():
+                    continue
+                present.add(entry.name)
+                stat = entry.stat()
+                signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+                if self.signatures.get(entry.name) == signature:
+                    continue
+                with open(entry.path, "rb") as f:
+                    feed = Feed(f.read(), stat.st_mtime)
+                previous = self.feeds.get(entry.name)
+                self.signatures[entry.name] = signature
+                if previous is not None and previous.digest == feed.digest:
+                    continue
+                # Remplacement d'un bloc : les requêtes en cours gardent l'ancien objet
+                self.feeds = {**self.feeds, entry.name: feed}
+                reloaded += 1
+                logging.info(f"Flux chargé : {entry.name} ({len(feed.variants['identity'])} octets)")
+            removed = set(self.feeds) - present
+            if removed:
+                self.feeds = {name: feed for name, feed in self.feeds.items() if name not in removed}
+                for name in removed:
+                    self.signatures.pop(name, None)
+                    logging.info(f"Flux retiré : {name}")
+        return reloaded
+
+    def watch(self, interval=RELOAD_INTERVAL, stop=None):
+        """Boucle de surveillance (à lancer dans un thread)"""
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            try:
+                self.reload()
+            except OSError as e:
+                logging.error(f"Erreur rechargement des flux : {e}")
+
+
+class ICSRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ESFCalendar/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_feed(head=False)
+
+    def do_HEAD(self):
+        self.send_feed(head=True)
+
+    def send_feed(self, head):
+        name = self.path.split("?", 1)[0].lstrip("/")
+        feed = self.server.store.get(name)
+        if feed is None:
+            self.send_error(404, "Calendrier introuvable")
+            return
+
+        encoding = choose_encoding(self.headers.get("Accept-Encoding"), feed.variants)
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            not_modified = feed.matches(if_none_match)
+        else:
+            since = self.headers.get("If-Modified-Since")
+            not_modified = since is not None and not feed.modified_since(since)
+
+        if not_modified:
+            self.send_response(304)
+            self.send_common_headers(feed, encoding)
+            self.end_headers()
+            return
+
+        body = feed.variants[encoding]
+        self.send_response(200)
+        self.send_common_headers(feed, encoding)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def send_common_headers(self, feed, encoding):
+        self.send_header("ETag", feed.etag(encoding))
+        self.send_header("Last-Modified", feed.last_modified)
+        self.send_header("Cache-Control", f"max-age={MAX_AGE}")
+        self.send_header("Vary", "Accept-Encoding")
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+
+def make_server(directory=ICS_DIR, host=HOST, port=PORT):
+    """Crée le serveur et charge les flux présents dans directory"""
+    store = FeedStore(directory)
+    store.reload()
+    server = ThreadingHTTPServer((host, port), ICSRequestHandler)
+    server.daemon_threads = True
+    server.store = store
+    return server
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Sert les calendriers ICS générés")
+    parser.add_argument("--dir", "-d", default=ICS_DIR, help="Dossier des fichiers .ics")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", "-p", type=int, default=PORT)
+    parser.add_argument("--interval", type=float, default=RELOAD_INTERVAL,
+                        help="Intervalle de surveillance des fichiers en secondes")
+    args = parser.parse_args()
+
+    server = make_server(args.dir, args.host, args.port)
+    threading.Thread(target=server.store.watch, args=(args.interval,), daemon=True).start()
+    for name in sorted(server.store.feeds):
+        print(f"📅 http://{args.host}:{args.port}/{name}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Export ICS découpé : un calendrier par moniteur (im), par type de cours (ctp)
+et/ou par lieu de rendez-vous (llr), pour que chacun s'abonne à son propre flux.
+
+Chaque événement n'est converti qu'une fois, même s'il figure dans plusieurs
+calendriers : les VEVENT absents du cache de fragments sont rendus dans un pool
+de processus, puis les calendriers sont assemblés en une passe sur les données.
+Chaque fichier est écrit de manière atomique, et seulement si son contenu change.
+
+Usage : python3 scripts/ics_shards.py [--input filtered_events.json] [--by im,ctp,llr]
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import run_metrics
+from ics_fragments import FragmentCache
+from ics_writer import ICSWriter, write_if_changed
+from json_to_ics_generator import CALENDAR_PROPERTIES, ICSGenerator
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin racine
+
+SHARD_DIR = os.getenv("ESF_ICS_SHARD_DIR", os.path.join(BASE_DIR, "calendars"))
+SHARD_BY = os.getenv("ESF_ICS_SHARD_BY", "im,ctp,llr")
+WORKERS = int(os.getenv("ESF_ICS_WORKERS", str(os.cpu_count() or 1)))
+# En dessous de ce nombre de conversions, le pool de processus coûte plus qu'il ne rapporte
+MIN_PARALLEL = int(os.getenv("ESF_ICS_MIN_PARALLEL", "2000"))
+CHUNK_SIZE = 500
+# Part minimale d'événements rendus pour supprimer les calendriers sans cours : en
+# dessous, l'échec vient du rendu (données ou code) et non du planning
+PRUNE_MIN_RENDERED = float(os.getenv("ESF_ICS_PRUNE_MIN_RENDERED", "0.5"))
+
+# Dimension -> (champ qui nomme le calendrier, libellé si le champ est vide)
+DIMENSIONS = {
+    "im": ("im", "sans-moniteur"),
+    "ctp": ("lp", "sans-type"),
+    "llr": ("llr", "sans-lieu"),
+}
+
+
+def slugify(value):
+    """Nom de fichier ASCII à partir d'un libellé ESF"""
+    value = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-") or "x"
+
+
+def shard_key(esf_event, dimension):
+    """(nom de fichier, libellé du calendrier) de l'événement pour une dimension"""
+    label_field, empty = DIMENSIONS[dimension]
+    value = esf_event.get(dimension)
+    if value in (None, ""):
+        return f"{dimension}-{empty}", empty
+    label = esf_event.get(label_field) or value
+    if dimension == "im":
+        # Plusieurs moniteurs peuvent avoir le même nom : l'identifiant reste dans le fichier
+        return f"im-{value}", str(label)
+    return f"{dimension}-{slugify(value)}", str(label)
+
+
+# --- Rendu dans les processus du pool ----------------------------------
+
+_generator = None
+
+
+def _render_chunk(args):
+    """Rend une liste de (événement, created) en fragments VEVENT (None si invalide)"""
+    global _generator
+    server_time, batch = args
+    if _generator is None:
+        _generator = ICSGenerator()
+    fragments = []
+    for esf_event, created in batch:
+        lines = _generator.convert_esf_to_ics_event(esf_event, server_time, created)
+        fragments.append(ICSWriter.render_component("VEVENT", lines) if lines else None)
+    return fragments
+
+
+def render_fragments(esf_events, server_time, cache, workers=WORKERS):
+    """
+    Fragment VEVENT de chaque événement (None si invalide) : depuis le cache si
+    (ih, dm) n'a pas changé, sinon rendu dans le pool de processus.
+    """
+    fragments = [cache.get(e.get("ih"), e.get("dm")) for e in esf_events]
+    missing = [i for i, fragment in enumerate(fragments) if fragment is None]
+    if not missing:
+        return fragments
+
+    generator = ICSGenerator()
+    jobs = []
+    for i in missing:
+        event = esf_events[i]
+        ih, dm = event.get("ih"), event.get("dm")
+        created = cache.created(ih, None) or (
+            generator.format_datetime_ics(generator.parse_esf_date(dm)) if dm else None)
+        jobs.append((event, created))
+    chunks = [(server_time, jobs[k:k + CHUNK_SIZE]) for k in range(0, len(jobs), CHUNK_SIZE)]
+
+    if workers > 1 and len(jobs) >= MIN_PARALLEL:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = [f for chunk in pool.map(_render_chunk, chunks) for f in chunk]
+    else:
+        rendered = [f for chunk in map(_render_chunk, chunks) for f in chunk]
+
+    for i, (item, created), fragment in zip(missing, jobs, rendered):
+        fragments[i] = fragment
+        if fragment is not None and created:
+            cache.put(item.get("ih"), item.get("dm"), created, fragment)
+    return fragments
+
+
+def calendar_properties(label):
+    """En-tête du calendrier avec le nom du découpage"""
+    return tuple(
+        f"X-WR-CALNAME:Calendrier ESF - {label}" if p.startswith("X-WR-CALNAME:") else p
+        for p in CALENDAR_PROPERTIES
+    )
+
+
+def write_shards(esf_events, server_time, dimensions=("im", "ctp", "llr"), output_dir=SHARD_DIR,
+                 cache=None, workers=WORKERS, prune=True):
+    """
+    Écrit un calendrier par valeur de chaque dimension dans output_dir.
+    Retourne {nom de fichier: (nombre d'événements, modifié)}.
+    """
+    for dimension in dimensions:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Découpage inconnu : {dimension} (attendu : {', '.join(DIMENSIONS)})")
+    with run_metrics.stage("ics_render"):
+        cache = cache if cache is not None else FragmentCache(path=None)
+        esf_events = list(esf_events)
+        fragments = render_fragments(esf_events, server_time, cache, workers)
+
+        # Une passe : chaque événement est rangé dans son calendrier pour chaque dimension
+        shards = {}
+        for esf_event, fragment in zip(esf_events, fragments):
+            if fragment is None:
+                continue
+            for dimension in dimensions:
+                name, label = shard_key(esf_event, dimension)
+                shards.setdefault(name, (label, []))[1].append(fragment)
+
+        os.makedirs(output_dir, exist_ok=True)
+        results = {}
+        for name, (label, shard_fragments) in sorted(shards.items()):
+            def write(stream):
+                with ICSWriter(stream, calendar_properties(label)) as writer:
+                    for fragment in shard_fragments:
+                        writer.write_rendered(fragment)
+                run_metrics.count("bytes_out", writer.bytes)
+                return writer.components
+            changed, count = write_if_changed(os.path.join(output_dir, f"{name}.ics"), write)
+            results[f"{name}.ics"] = (count, changed)
+
+        rendered = sum(1 for fragment in fragments if fragment is not None)
+        if prune and (not rendered or rendered < len(esf_events) * PRUNE_MIN_RENDERED):
+            logging.warning(f"Seulement {rendered}/{len(esf_events)} événements rendus : "
+                            f"calendriers existants conservés")
+            prune = False
+        if prune:
+            # Calendriers des moniteurs / types / lieux qui n'ont plus de cours
+            for dimension in dimensions:
+                for path in glob.glob(os.path.join(output_dir, f"{dimension}-*.ics")):
+                    if os.path.basename(path) not in results:
+                        os.remove(path)
+                        logging.info(f"Calendrier supprimé : {os.path.basename(path)}")
+        run_metrics.count("items", len(esf_events))
+        run_metrics.count("files_changed", sum(1 for _, c in results.values() if c))
+        run_metrics.count("cache_hits", cache.hits)
+
+    changed = sum(1 for _, c in results.values() if c)
+    logging.info(f"{len(results)} calendriers dans {output_dir} ({changed} modifiés), "
+                 f"fragments : {cache.hits} réutilisés, {cache.misses} rendus")
+    return results
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Génère un calendrier ICS par moniteur, type de cours ou lieu")
+    parser.add_argument("--input", "-i", default="filtered_events.json",
+                        help="Fichier JSON d'entrée (défaut: filtered_events.json)")
+    parser.add_argument("--output-dir", "-o", default=SHARD_DIR,
+                        help="Dossier des calendriers (défaut: calendars/)")
+    parser.add_argument("--by", default=SHARD_BY,
+                        help="Découpages séparés par des virgules parmi im, ctp, llr (défaut: im,ctp,llr)")
+    parser.add_argument("--workers", "-w", type=int, default=WORKERS,
+                        help="Nombre de processus de rendu")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Reconvertit tous les événements sans utiliser le cache de fragments")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    esf_events = data.get("Items", [])
+    if not esf_events:
+        logging.warning("Aucun événement trouvé dans le fichier JSON")
+        return 1
+
+    server_time = data.get("ServerTime")
+    if not server_time:
+        logging.warning("ServerTime non trouvé, utilisation de l'heure actuelle")
+        server_time = f"/Date({int(datetime.now().timestamp() * 1000)}+0100)/"
+
+    run_metrics.start("esf_ics_shards")
+    cache = FragmentCache(path=None) if args.no_cache else FragmentCache()
+    dimensions = [d.strip() for d in args.by.split(",") if d.strip()]
+    results = write_shards(esf_events, server_time, dimensions, args.output_dir,
+                           cache, args.workers)
+    if not args.no_cache:
+        cache.prune()
+        cache.save()
+    run_metrics.export()
+    print(f"✅ {len(results)} calendriers générés dans {args.output_dir}")
+    print(f"📅 Pour s'abonner : python3 scripts/ics_server.py --dir {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,146 @@
+"""
+Écriture en flux d'un calendrier iCalendar (RFC 5545).
+Chaque ligne est terminée par CRLF et pliée à 75 octets (les lignes de
+continuation commencent par une espace), sans couper un caractère UTF-8.
+Chaque composant (VEVENT) est écrit dès qu'il est prêt : la mémoire utilisée
+ne dépend pas du nombre d'événements. La sortie est un flux binaire
+(fichier ouvert en "wb", socket.makefile("wb"), BytesIO...).
+"""
+import hashlib
+import os
+
+CRLF = b"\r\n"
+# Longueur maximale d'une ligne, CRLF exclu (RFC 5545, section 3.1)
+MAX_LINE_OCTETS = 75
+
+
+def fold_line(line):
+    """Encode une ligne de contenu en UTF-8, pliée à 75 octets, terminée par CRLF"""
+    data = line.encode("utf-8")
+    if len(data) <= MAX_LINE_OCTETS:
+        return data + CRLF
+    parts = []
+    start = 0
+    # L'espace de continuation compte dans les 75 octets des lignes suivantes
+    limit = MAX_LINE_OCTETS
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # Ne pas couper au milieu d'une séquence UTF-8 (octets 10xxxxxx)
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end])
+        start = end
+        limit = MAX_LINE_OCTETS - 1
+    return (CRLF + b" ").join(parts) + CRLF
+
+
+def escape_text(text):
+    """Échappe une valeur TEXT (\\, ;, , et retours à la ligne)"""
+    if not text:
+        return ""
+    text = str(text)
+    text = text.replace("\\", "\\\\")
+    text = text.replace(",", "\\,")
+    text = text.replace(";", "\\;")
+    text = text.replace("\r\n", "\\n").replace("\n", "\\n")
+    text = text.replace("\r", "")
+    return text
+
+
+class ICSWriter:
+    """Écrit un VCALENDAR composant par composant dans un flux binaire"""
+
+    def __init__(self, stream, properties=()):
+        self.stream = stream
+        self.properties = properties
+        self.components = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.end()
+
+    def write_lines(self, lines):
+        """Plie et écrit des lignes de contenu en un seul appel à write()"""
+        data = b"".join(fold_line(line) for line in lines)
+        self.stream.write(data)
+        self.bytes += len(data)
+
+    @staticmethod
+    def render_component(name, lines):
+        """Octets d'un composant complet (BEGIN:name ... END:name), déjà pliés"""
+        return b"".join(fold_line(line) for line in (f"BEGIN:{name}", *lines, f"END:{name}"))
+
+    def write_rendered(self, fragment):
+        """Écrit un composant rendu par render_component (ex : depuis un cache)"""
+        self.stream.write(fragment)
+        self.components += 1
+        self.bytes += len(fragment)
+
+    def begin(self):
+        self.write_lines(["BEGIN:VCALENDAR", *self.properties])
+
+    def write_component(self, name, lines):
+        """Écrit BEGIN:name, les lignes de propriétés, puis END:name"""
+        self.write_rendered(self.render_component(name, lines))
+
+    def end(self):
+        self.write_lines(["END:VCALENDAR"])
+        self.stream.flush()
+
+
+class HashingStream:
+    """Flux binaire qui calcule le SHA-256 de tout ce qui y est écrit"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+def file_digest(path, chunk_size=1 << 16):
+    """SHA-256 d'un fichier existant (None s'il n'existe pas)"""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    sha256 = hashlib.sha256()
+    with f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def write_if_changed(path, write):
+    """
+    Appelle write(flux) sur un fichier temporaire puis remplace path de manière
+    atomique, sauf si le contenu est identique (le fichier et sa date de
+    modification restent alors inchangés). Retourne (modifié, résultat de write).
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            stream = HashingStream(f)
+            result = write(stream)
+        if stream.hexdigest() == file_digest(path):
+            os.remove(tmp_path)
+            return False, result
+        os.replace(tmp_path, path)
+        return True, result
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -2,75 +2,50 @@
 # serveur lors de l'ajout de l'évènement. Pour cela j'ai ajouté la ligne 29 :
 # "ServerTime": data["ServerTime"],  # Ajout de la valeur ServerTime
 #dans tri_json_2402_v0.py
+import base64
 import json
 import os
-import pytz
 import logging
-import re
 import sys
+import hashlib
+import time
 from dotenv import load_dotenv
-from datetime import datetime, timezone, timedelta
-from dateutil.parser import parse
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-logging.basicConfig(level=logging.DEBUG)  # Ajoutez ceci au début du script
+from datetime import datetime, timezone
+from sync_state import SyncState
+import esf_dates
+from google_executor import ApiExecutor, backoff_delay, error_status, get_executor, is_retriable
+import run_metrics
+# Niveau réglable par ESF_LOG_LEVEL ; en DEBUG, googleapiclient journalise chaque requête
+logging.basicConfig(level=os.getenv("ESF_LOG_LEVEL", "INFO").upper())
+for _name in ("googleapiclient", "google_auth_httplib2", "urllib3"):
+    logging.getLogger(_name).setLevel(logging.WARNING)
 # Configuration des scopes
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 load_dotenv()
 CALENDAR_ID = os.getenv("CALENDAR_ID")
+TOKEN_FILE = "config/token.json"
+# Nombre maximal de requêtes par lot (limite de l'API batch Google : 1000, recommandé : 50)
+BATCH_SIZE = 50
+# Serveur Calendar de remplacement (tests de charge locaux), ex : http://127.0.0.1:8092/calendar/v3/
+API_ENDPOINT = os.getenv("GOOGLE_API_ENDPOINT")
+BATCH_URI = os.getenv("GOOGLE_API_BATCH_URI")
+# Identifiants et client Calendar réutilisés d'une étape à l'autre (voir get_google_calendar_service)
+_credentials = None
+_service = None
 
 def convert_esf_to_french_date(esf_date):
     """
     Convertit un format de date ESF (avec ou sans offset) en date française formatée.
     """
     try:
-        # Nouvelle regex plus robuste
-        match = re.match(r"/Date\((\d+)([+-]\d{4})?\)/", esf_date)
-        if not match:
-            raise ValueError(f"Format ESF invalide : {esf_date}")
-
-        timestamp_ms = int(match.group(1))
-        offset_str = match.group(2) or "+0000"  # Gestion de l'offset manquant
-
-        # Conversion du timestamp en datetime UTC
-        timestamp_sec = timestamp_ms // 1000
-        date_utc = datetime.utcfromtimestamp(timestamp_sec).replace(tzinfo=timezone.utc)
-
-        # Ajustement avec l'offset
-        offset_hours = int(offset_str[:3])  # Extraction des heures (+/-XX)
-        date_adjusted = date_utc + timedelta(hours=offset_hours)
-
-        # Conversion finale en Europe/Paris
-        timezone_paris = pytz.timezone("Europe/Paris")
-        return date_adjusted.astimezone(timezone_paris).strftime("%d/%m/%Y %H:%M:%S")
-
+        return esf_dates.to_french(esf_date)
     except Exception as e:
         raise ValueError(f"Erreur de conversion pour {esf_date} : {str(e)}") from e
 
 def parse_esf_date(esf_date):
     """Convertit le format de date ESF en datetime Europe/Paris (sans double offset)"""
     try:
-        match = re.match(r"/Date\((\d+)([+-]\d{4})?\)/", esf_date)
-        if not match:
-            raise ValueError(f"Format de date ESF invalide : {esf_date}")
-
-        timestamp_ms = int(match.group(1))
-        offset_str = match.group(2) or "+0000"
-
-        # Conversion de l'offset (+/-HHMM) en délai
-        offset_h = int(offset_str[:3])
-        offset_m = int(offset_str[3:5]) if len(offset_str) > 3 else 0
-        tz_offset = timezone(timedelta(hours=offset_h, minutes=offset_m))
-
-        # Création du datetime AVEC l'offset d'origine
-        dt = datetime.fromtimestamp(timestamp_ms // 1000, tz=tz_offset)
-
-        # Conversion en Europe/Paris (gère les DST automatiquement)
-        tz_paris = pytz.timezone("Europe/Paris")
-        return dt.astimezone(tz_paris)
-
+        return esf_dates.parse(esf_date)
     except Exception as e:
         logging.error(f"Erreur parsing date {esf_date} : {str(e)}")
         return None
@@ -86,74 +61,253 @@ def get_calendar_events(service, CALENDAR_ID, time_min, time_max):
     ).execute()
     return events_result.get('items', [])
 
-def compare_with_calendar(service, new_events, server_time):
-    """Compare les événements via le champ 'ih' et retourne les nouveaux"""
-    # Récupérer tous les 'ih' existants dans le calendrier
-    existing_ih = set()
+LISTING_FIELDS = "nextPageToken,nextSyncToken,items(id,status,start,extendedProperties/private)"
+
+
+def _event_start(event):
+    """Début d'un événement Google en epoch (None pour les journées entières)"""
+    date_time = event.get('start', {}).get('dateTime')
+    return datetime.fromisoformat(date_time.replace('Z', '+00:00')).timestamp() if date_time else None
+
+
+def list_calendar_ihs(service, time_min=None, time_max=None, executor=None):
+    """
+    Listing complet du calendrier, borné à [time_min, time_max[ si fournis (RFC3339).
+    Retourne ({ih ESF: (id Google, début epoch, esf_hash)}, nextSyncToken ou None).
+    """
+    executor = executor or ApiExecutor()
+    remote = {}
     page_token = None
-    
-    try:
-        while True:
-            # Récupération par pages (max 2500 événements/page)
-            events_batch = service.events().list(
-                calendarId=CALENDAR_ID,
-                pageToken=page_token,
-                maxResults=2500,
-                fields="items(id,extendedProperties/private)"
-            ).execute()
-            
-            # Extraction des 'ih' depuis extendedProperties
-            for event in events_batch.get('items', []):
-                private_props = event.get('extendedProperties', {}).get('private', {})
-                if 'esf_ih' in private_props:
-                    existing_ih.add(private_props['esf_ih'])
-            
-            page_token = events_batch.get('nextPageToken')
-            if not page_token:
-                break
+    sync_token = None
+    params = {}
+    if time_min:
+        params['timeMin'] = time_min
+    if time_max:
+        params['timeMax'] = time_max
+
+    while True:
+        # Récupération par pages (max 2500 événements/page)
+        events_batch = executor.execute(service.events().list(
+            calendarId=CALENDAR_ID,
+            pageToken=page_token,
+            maxResults=2500,
+            fields=LISTING_FIELDS,
+            **params
+        ), label="events.list")
+
+        # Extraction des 'ih' depuis extendedProperties
+        for event in events_batch.get('items', []):
+            private_props = event.get('extendedProperties', {}).get('private', {})
+            if 'esf_ih' in private_props:
+                remote[private_props['esf_ih']] = (
+                    event['id'], _event_start(event), private_props.get('esf_hash')
+                )
+
+        page_token = events_batch.get('nextPageToken')
+        if not page_token:
+            sync_token = events_batch.get('nextSyncToken')
+            break
+
+    return remote, sync_token
+
+
+def apply_calendar_changes(service, state, sync_token, executor=None):
+    """
+    Applique à l'index local les changements du calendrier depuis sync_token.
+    Retourne le nouveau syncToken. Lève HttpError 410 si le jeton a expiré.
+    """
+    executor = executor or ApiExecutor()
+    page_token = None
+    changes = 0
 
+    while True:
+        events_batch = executor.execute(service.events().list(
+            calendarId=CALENDAR_ID,
+            syncToken=sync_token,
+            pageToken=page_token,
+            maxResults=2500,
+            showDeleted=True,
+            fields=LISTING_FIELDS
+        ), label="events.list sync")
+
+        for event in events_batch.get('items', []):
+            changes += 1
+            if event.get('status') == 'cancelled':
+                # Les événements supprimés ne portent plus leurs extendedProperties
+                state.delete_by_google_id(event['id'])
+                continue
+            private_props = event.get('extendedProperties', {}).get('private', {})
+            if 'esf_ih' in private_props:
+                state.apply_remote(
+                    private_props['esf_ih'], event['id'], _event_start(event), private_props.get('esf_hash')
+                )
+
+        page_token = events_batch.get('nextPageToken')
+        if not page_token:
+            logging.info(f"{changes} changements dans le calendrier depuis la dernière synchronisation")
+            return events_batch.get('nextSyncToken')
+
+
+def esf_time_window(esf_events):
+    """Période couverte par les événements ESF : (timeMin, timeMax) en RFC3339, ou (None, None)"""
+    starts = [parse_esf_date(e['dd']) for e in esf_events if e.get('dd')]
+    ends = [parse_esf_date(e['df']) for e in esf_events if e.get('df')]
+    starts = [d for d in starts if d]
+    ends = [d for d in ends if d]
+    if not starts or not ends:
+        return None, None
+    return min(starts).isoformat(), max(ends).isoformat()
+
+
+def refresh_index(service, state, time_min=None, time_max=None, executor=None):
+    """
+    Met à jour l'index local depuis le calendrier :
+    - avec un syncToken, seuls les changements sont téléchargés ;
+    - sinon (premier passage, jeton expiré), listing complet borné à la période ESF
+      lorsqu'une réconciliation est due.
+    """
+    sync_token = state.get_meta("sync_token")
+    if sync_token:
+        try:
+            state.set_meta("sync_token", apply_calendar_changes(service, state, sync_token, executor))
+            return
+        except Exception as e:
+            if error_status(e) != 410:
+                raise
+            logging.warning("syncToken expiré (410), resynchronisation complète")
+            state.set_meta("sync_token", None)
+    elif not state.needs_reconciliation():
+        return
+
+    remote, next_sync_token = list_calendar_ihs(service, time_min, time_max, executor)
+    state.reconcile(
+        remote,
+        datetime.fromisoformat(time_min).timestamp() if time_min else None,
+        datetime.fromisoformat(time_max).timestamp() if time_max else None,
+    )
+    state.set_meta("sync_token", next_sync_token)
+    logging.info(f"Index local réconcilié avec le calendrier ({len(remote)} événements ESF)")
+
+
+def sync_index(service, state, time_min=None, time_max=None, executor=None):
+    """Met à jour l'index local ; en cas d'erreur, l'index existant est utilisé"""
+    try:
+        refresh_index(service, state, time_min, time_max, executor)
     except Exception as e:
-        # logging.error(f"Erreur récupération calendrier: {str(e)}")
-        return []
-
-    # Filtrer les nouveaux événements
-    to_add = []
-    for esf_event in new_events:
-        esf_ih = str(esf_event.get('ih'))  # Conversion forcée en string
-        if not esf_ih:
+        if state.get_meta("last_reconciliation") is None:
+            # Index jamais initialisé : on ne peut pas savoir ce qui existe déjà
+            raise RuntimeError(f"Impossible de lister le calendrier : {e}") from e
+        logging.error(f"Erreur récupération calendrier, utilisation de l'index local : {str(e)}")
+
+
+def plan_changes(esf_events, server_time, state, window=None, removed=(), removed_after=None):
+    """
+    Calcule le plan minimal de synchronisation à partir de l'index local :
+    - inserts : (ih, événement ESF, événement Google) absents du calendrier
+    - patches : (ih, id Google, événement ESF, événement Google) dont l'empreinte a changé
+    - deletes : (ih, id Google) disparus de l'ESF dans la période window (epoch)
+                ou listés dans removed et débutant à partir de removed_after (epoch)
+    """
+    known = state.all()
+    inserts, patches, deletes = [], [], []
+    seen = set()
+
+    for esf_event in esf_events:
+        ih = str(esf_event.get('ih'))
+        seen.add(ih)
+        row = known.get(ih)
+        gevent = convert_esf_to_google_event(esf_event, server_time)
+        if not gevent:
             continue
+        if row is None:
+            inserts.append((ih, esf_event, gevent))
+        elif row[1] != event_hash(gevent):
+            patches.append((ih, row[0], esf_event, gevent))
 
-        if esf_ih not in existing_ih:
-            to_add.append(esf_event)
-            # logging.info(f"Nouvel événement détecté (IH: {esf_ih}")
-        # else:
-            # logging.debug(f"Événement déjà existant (IH: {esf_ih}")
+    to_delete = set(str(ih) for ih in removed)
+    if removed_after is not None:
+        # Un cours commencé disparaît de la réponse ESF sans être annulé
+        to_delete &= set(state.in_window(removed_after, None))
+    if window is not None:
+        to_delete |= set(state.in_window(*window)) - seen
+    for ih in sorted(to_delete - seen):
+        if ih in known:
+            deletes.append((ih, known[ih][0]))
 
-    return to_add
+    return inserts, patches, deletes
 
 
-def get_google_calendar_service():
-    """Authentification Google"""
-    creds = None
-    token_file = "config/token.json"
-    
-    if os.path.exists(token_file):
-        creds = Credentials.from_authorized_user_file(token_file, SCOPES)
-    
+def event_hash(gevent):
+    """Empreinte stable du contenu d'un événement Google converti"""
+    return gevent['extendedProperties']['private']['esf_hash']
+
+
+def content_hash(esf_event, start, end):
+    """
+    Empreinte des seules données ESF affichées dans l'événement.
+    La date de synchronisation (ServerTime) en est exclue : elle change à chaque passage.
+    """
+    content = [
+        esf_event.get('lp'), esf_event.get('llr'), start.isoformat(), end.isoformat(),
+        esf_event.get('lne'), esf_event.get('lle'), esf_event.get('nl'), esf_event.get('dm'),
+        esf_event.get('cm'),
+    ]
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def get_credentials():
+    """
+    Identifiants OAuth chargés une fois par processus : le jeton n'est renouvelé
+    (et config/token.json réécrit) que lorsqu'il a expiré.
+    """
+    global _credentials
+    creds = _credentials
+    if creds is None and os.path.exists(TOKEN_FILE):
+        from google.oauth2.credentials import Credentials
+        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
+            from google.auth.transport.requests import Request
             creds.refresh(Request())
         else:
+            from google_auth_oauthlib.flow import InstalledAppFlow
             flow = InstalledAppFlow.from_client_secrets_file(
                 'config/credentials.json', 
                 SCOPES
             )
             creds = flow.run_local_server(port=0)
         
-        with open(token_file, 'w') as token:
+        with open(TOKEN_FILE, 'w') as token:
             token.write(creds.to_json())
-    
-    return build('calendar', 'v3', credentials=creds)
+
+    _credentials = creds
+    return creds
+
+
+def get_google_calendar_service():
+    """
+    Client Google Calendar partagé par les étapes du processus. Le document de
+    découverte est celui fourni avec googleapiclient (pas de requête réseau ni de
+    cache disque) ; le client n'est construit qu'au premier appel.
+    """
+    global _service
+    if API_ENDPOINT:
+        # Serveur de test local : pas d'authentification OAuth
+        if _service is None:
+            from google.auth.credentials import AnonymousCredentials
+            from googleapiclient.discovery import build
+            _service = build('calendar', 'v3', credentials=AnonymousCredentials(),
+                             client_options={"api_endpoint": API_ENDPOINT},
+                             static_discovery=True, cache_discovery=False)
+        return _service
+
+    # Les mêmes identifiants sont renouvelés sur place : le client existant reste valable
+    creds = get_credentials()
+    if _service is None:
+        from googleapiclient.discovery import build
+        _service = build('calendar', 'v3', credentials=creds, static_discovery=True, cache_discovery=False)
+    return _service
 
 def create_calendar_event(service, event_data):
     """Crée un événement calendrier à partir du format ESF"""
@@ -175,6 +329,86 @@ def create_calendar_event(service, event_data):
         logging.error(f"Échec de création d'événement : {str(e)}")
         return None
 
+def event_id(ih):
+    """
+    Identifiant Google déterministe du cours ih (base32hex en minuscules, comme l'exige
+    l'API) : un ajout renvoyé après une erreur dont l'issue est inconnue (5xx, coupure
+    réseau) est refusé en 409 au lieu de créer un doublon.
+    """
+    return base64.b32hexencode(f"esf{ih}".encode("utf-8")).decode("ascii").rstrip("=").lower()
+
+
+def insert_request(service, ih, gevent):
+    return service.events().insert(calendarId=CALENDAR_ID, body={**gevent, 'id': event_id(ih)})
+
+
+def patch_request(service, google_id, gevent):
+    return service.events().patch(calendarId=CALENDAR_ID, eventId=google_id, body=gevent)
+
+
+def delete_request(service, google_id):
+    return service.events().delete(calendarId=CALENDAR_ID, eventId=google_id)
+
+
+def _run_batch(service, chunk, http):
+    """Envoie un lot ; retourne [(réponse, exception)] dans l'ordre du lot"""
+    chunk_results = {}
+
+    def callback(request_id, response, exception):
+        chunk_results[int(request_id)] = (response, exception)
+
+    if BATCH_URI:
+        from googleapiclient.http import BatchHttpRequest
+        batch = BatchHttpRequest(callback=callback, batch_uri=BATCH_URI)
+    else:
+        batch = service.new_batch_http_request(callback=callback)
+    for i, (ih, request) in enumerate(chunk):
+        batch.add(request, request_id=str(i))
+    batch.execute(http=http)
+    return [chunk_results.get(i, (None, RuntimeError("Réponse absente du lot"))) for i in range(len(chunk))]
+
+
+def execute_batch(service, calls, executor=None):
+    """
+    Envoie les requêtes API par lots de BATCH_SIZE (requêtes batch Google),
+    plusieurs lots en parallèle via l'exécuteur (débit limité, nouvelles tentatives).
+    calls : liste de (ih, requête non exécutée).
+    Retourne une liste de (ih, réponse, exception) : chaque sous-requête
+    réussit ou échoue indépendamment des autres ; celles refusées pour cause
+    de quota ou d'erreur serveur sont renvoyées dans un lot suivant.
+    """
+    executor = executor or ApiExecutor()
+    results = []
+    pending = list(calls)
+
+    for attempt in range(executor.max_retries + 1):
+        chunks = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+        outcomes = executor.map(
+            lambda chunk, http: _run_batch(service, chunk, http), chunks, cost=len, label="batch"
+        )
+
+        retry = []
+        for chunk, (chunk_results, batch_error) in zip(chunks, outcomes):
+            if batch_error is not None:
+                # Échec du lot entier (réseau, authentification...)
+                logging.error(f"Échec du lot de {len(chunk)} requêtes : {str(batch_error)}")
+                results.extend((ih, None, batch_error) for ih, _ in chunk)
+                continue
+            for (ih, request), (response, error) in zip(chunk, chunk_results):
+                if error is not None and is_retriable(error) and attempt < executor.max_retries:
+                    retry.append((ih, request))
+                else:
+                    results.append((ih, response, error))
+
+        if not retry:
+            break
+        logging.warning(f"{len(retry)} requêtes refusées temporairement, nouvel essai")
+        time.sleep(backoff_delay(attempt))
+        pending = retry
+
+    return results
+
+
 def convert_esf_to_google_event(esf_event, server_time):
     """Convertit le format ESF en structure Google Calendar"""
     try:
@@ -190,7 +424,10 @@ def convert_esf_to_google_event(esf_event, server_time):
 
         return {
             'extendedProperties': {
-                'private': {'esf_ih': str(esf_event['ih'])}
+                'private': {
+                    'esf_ih': str(esf_event['ih']),
+                    'esf_hash': content_hash(esf_event, start, end)
+                }
             },
             'summary': esf_event.get('lp', 'Cours ESF'),
             'location': esf_event.get('llr', ''),
@@ -215,6 +452,121 @@ Autres Infos:    {esf_event.get('cm', 'Inconnu')}""",
         return None
 
 
+def record_api_calls(executor, since=0):
+    """Reporte les appels API faits depuis since dans les mesures de l'étape en cours"""
+    summary = executor.metrics.summary(since)
+    run_metrics.count("api_calls", summary["calls"])
+    run_metrics.count("retries", summary["retries"])
+    run_metrics.count("api_errors", summary["errors"])
+    run_metrics.count("throttled_seconds", summary["throttled"])
+    run_metrics.count("bytes_in", summary["bytes_in"])
+
+
+def import_events(data, service=None):
+    """
+    Synchronise Google Calendar avec les événements filtrés (dict Items + ServerTime) :
+    ajout des nouveaux cours, mise à jour des cours modifiés et suppression des cours
+    disparus de la période récupérée (DateDebut/DateFin) ou listés dans Removed.
+    Retourne la liste des ih dont l'ajout, la mise à jour ou la suppression a échoué.
+    """
+    if not CALENDAR_ID:
+        raise ValueError("CALENDAR_ID non configuré")
+
+    if service is None:
+        service = get_google_calendar_service()
+
+    # L'index est refermé même si une étape échoue (le mode continu réutilise le processus)
+    state = SyncState()
+    try:
+        return _sync_events(data, service, state)
+    finally:
+        state.close()
+
+
+def _sync_events(data, service, state):
+    """Corps de import_events : plan de synchronisation puis écriture par lots"""
+    esf_events = data.get('Items', [])
+    server_time = data.get('ServerTime')  # Récupération de ServerTime
+
+    # Période couverte par la récupération : seuls les cours de cette période
+    # peuvent être supprimés s'ils ont disparu de l'ESF, et seulement si toutes
+    # les écoles et fenêtres ont répondu
+    window = None
+    removed_after = parse_esf_date(data['DateDebut']).timestamp() if data.get('DateDebut') else time.time()
+    if data.get('Incomplete'):
+        logging.warning("Récupération ESF incomplète : aucune suppression à ce passage")
+    if not data.get('Incremental') and not data.get('Incomplete') and data.get('DateDebut') and data.get('DateFin'):
+        window = (parse_esf_date(data['DateDebut']).timestamp(), parse_esf_date(data['DateFin']).timestamp())
+        time_min, time_max = (datetime.fromtimestamp(t, timezone.utc).isoformat() for t in window)
+    else:
+        time_min, time_max = esf_time_window(esf_events)
+
+    executor = get_executor(service)
+    with run_metrics.stage("diff"):
+        sync_index(service, state, time_min, time_max, executor)
+        inserts, patches, deletes = plan_changes(
+            esf_events, server_time, state, window, data.get('Removed', ()), removed_after
+        )
+        record_api_calls(executor)
+        run_metrics.count("items", len(esf_events))
+        run_metrics.count("inserts", len(inserts))
+        run_metrics.count("patches", len(patches))
+        run_metrics.count("deletes", len(deletes))
+    logging.info(f"Plan : {len(inserts)} ajouts, {len(patches)} mises à jour, {len(deletes)} suppressions")
+
+    # Affichez les dates APRÈS conversion
+    # logging.debug(f"Dates converties : Début={gevent['start']['dateTime']}, Fin={gevent['end']['dateTime']}")
+
+    with run_metrics.stage("write"):
+        since = len(executor.metrics.calls)
+        calls = []
+        pending = {}
+        for ih, event_data, gevent in inserts:
+            calls.append((ih, insert_request(service, ih, gevent)))
+            pending[ih] = ('insert', event_data, gevent)
+        for ih, google_id, event_data, gevent in patches:
+            calls.append((ih, patch_request(service, google_id, gevent)))
+            pending[ih] = ('patch', event_data, gevent)
+        for ih, google_id in deletes:
+            calls.append((ih, delete_request(service, google_id)))
+            pending[ih] = ('delete', None, None)
+        run_metrics.count("items", len(calls))
+
+        results = execute_batch(service, calls, executor)
+
+        # 409 sur un ajout : l'événement existe déjà sous cet identifiant (ajout effectué
+        # mais réponse perdue, ou cours supprimé puis revenu) ; il est mis à jour et confirmé
+        duplicates = {ih for ih, _, error in results if pending[ih][0] == 'insert' and error_status(error) == 409}
+        if duplicates:
+            restore = [(ih, patch_request(service, event_id(ih), {**pending[ih][2], 'status': 'confirmed'}))
+                       for ih in sorted(duplicates)]
+            results = [r for r in results if r[0] not in duplicates] + execute_batch(service, restore, executor)
+
+        failed = []
+        for ih, response, error in results:
+            action, event_data, gevent = pending[ih]
+            if action == 'delete':
+                # Un événement déjà supprimé à la main (404/410) est retiré de l'index
+                if error is None or getattr(getattr(error, 'resp', None), 'status', None) in (404, 410):
+                    state.delete(ih)
+                else:
+                    logging.error(f"Échec suppression événement IH={ih} : {str(error)}")
+                    failed.append(ih)
+                continue
+            if error is not None:
+                logging.error(f"Échec {'ajout' if action == 'insert' else 'mise à jour'} événement IH={ih} : {str(error)}")
+                failed.append(ih)
+                continue
+            state.upsert(
+                ih, response['id'], event_hash(gevent), event_data.get('dm'),
+                datetime.fromisoformat(gevent['start']['dateTime']).timestamp()
+            )
+        record_api_calls(executor, since)
+
+    logging.info(f"Appels API : {executor.metrics.summary()}")
+    return failed
+
+
 def main():
     if not CALENDAR_ID:
     	logging.critical("CALENDAR_ID non configuré")
@@ -226,36 +578,11 @@ def main():
     try:
         with open("filtered_events.json", "r") as f:
             data = json.load(f)
-            esf_events = data.get('Items', [])
-            server_time = data.get('ServerTime')  # Récupération de ServerTime
     except Exception as e:
         logging.error(f"Erreur chargement données: {str(e)}")
         return
 
-    # Passer server_time à compare_with_calendar
-    new_events = compare_with_calendar(service, esf_events, server_time)
-
-    for event_data in new_events:
-        try:
-            # Affichez les données brutes AVANT conversion
-            # logging.debug(f"Données ESF brutes (IH={event_data.get('ih')}) : {json.dumps(event_data, indent=2)}")
-            
-            # Conversion et ajout
-            gevent = convert_esf_to_google_event(event_data, server_time)
-            if not gevent:
-                continue
-
-            # Affichez les dates APRÈS conversion
-            # logging.debug(f"Dates converties : Début={gevent['start']['dateTime']}, Fin={gevent['end']['dateTime']}")
-            
-            # Appel à l'API
-            service.events().insert(
-                calendarId=CALENDAR_ID,
-                body=gevent
-            ).execute()
-
-        except Exception as e:
-            logging.error(f"Échec ajout événement IH={event_data.get('ih')} : {str(e)}")
+    import_events(data, service)
 
 if __name__ == "__main__":
     main()
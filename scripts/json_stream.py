@@ -0,0 +1,104 @@
+"""
+Lecture itérative d'une réponse GetListeHorairesMoniteur.
+Le tableau "Items" est décodé élément par élément au fil de la lecture du fichier,
+sans jamais charger l'ensemble du document en mémoire.
+"""
+import json
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789+-.eE"
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Tampon de lecture par blocs au-dessus d'un fichier texte"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Lit un bloc supplémentaire ; retourne False en fin de fichier"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # On libère la partie déjà consommée du tampon
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Retourne le prochain caractère significatif (ou "" en fin de fichier)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"JSON invalide : '{char}' attendu à la position {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Décode la prochaine valeur JSON complète"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # Un nombre coupé par la fin du tampon (ex : "2." ou "1e-") est décodé comme son
+            # préfixe : tant qu'aucun séparateur ne le suit, on relit pour s'en assurer
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and not self.buffer[end:].strip(NUMBER_CHARS) and self.fill()):
+                continue
+            self.pos = end
+            return value
+
+
+def iter_payload(f, array_key="Items", chunk_size=CHUNK_SIZE):
+    """
+    Parcourt un objet JSON de premier niveau.
+    Génère ("item", élément) pour chaque élément du tableau array_key,
+    et ("meta", (clé, valeur)) pour les autres clés.
+    """
+    reader = _Reader(f, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == array_key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield "item", reader.value()
+                    if reader.peek() == ",":
+                        reader.pos += 1
+                        continue
+                    reader.expect("]")
+                    break
+        else:
+            yield "meta", (key, reader.value())
+
+        if reader.peek() == ",":
+            reader.pos += 1
+            continue
+        reader.expect("}")
+        return
@@ -8,42 +8,37 @@ compatible avec tous les clients de calendrier (Outlook, Google Calendar, Apple
 
 import json
 import os
-import re
 import logging
-from datetime import datetime, timezone, timedelta
-from dateutil.parser import parse
-import pytz
-import hashlib
+from datetime import datetime, timezone
+
+import esf_dates
+import run_metrics
+from ics_fragments import FragmentCache
+from ics_writer import ICSWriter, escape_text, write_if_changed
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Propriétés de l'en-tête du calendrier
+CALENDAR_PROPERTIES = (
+    "VERSION:2.0",
+    "PRODID:-//ESF Calendar Generator//ESF Events//FR",
+    "CALSCALE:GREGORIAN",
+    "METHOD:PUBLISH",
+    "X-WR-CALNAME:Calendrier ESF",
+    "X-WR-CALDESC:Événements automatiquement synchronisés depuis l'ESF",
+    "X-WR-TIMEZONE:Europe/Paris",
+)
+
 class ICSGenerator:
     def __init__(self, output_filename="esf_calendar.ics"):
         self.output_filename = output_filename
-        self.timezone_paris = pytz.timezone("Europe/Paris")
+        self.timezone_paris = esf_dates.TIMEZONE_PARIS
         
     def parse_esf_date(self, esf_date):
         """Convertit le format de date ESF en datetime Europe/Paris"""
         try:
-            match = re.match(r"/Date\((\d+)([+-]\d{4})?\)/", esf_date)
-            if not match:
-                raise ValueError(f"Format de date ESF invalide : {esf_date}")
-
-            timestamp_ms = int(match.group(1))
-            offset_str = match.group(2) or "+0000"
-
-            # Conversion de l'offset (+/-HHMM) en délai
-            offset_h = int(offset_str[:3])
-            offset_m = int(offset_str[3:5]) if len(offset_str) > 3 else 0
-            tz_offset = timezone(timedelta(hours=offset_h, minutes=offset_m))
-
-            # Création du datetime AVEC l'offset d'origine
-            dt = datetime.fromtimestamp(timestamp_ms // 1000, tz=tz_offset)
-
-            # Conversion en Europe/Paris (gère les DST automatiquement)
-            return dt.astimezone(self.timezone_paris)
-
+            return esf_dates.parse(esf_date)
         except Exception as e:
             logging.error(f"Erreur parsing date {esf_date} : {str(e)}")
             return None
@@ -51,36 +46,13 @@ class ICSGenerator:
     def convert_esf_to_french_date(self, esf_date):
         """Convertit un format de date ESF en date française formatée pour affichage"""
         try:
-            match = re.match(r"/Date\((\d+)([+-]\d{4})?\)/", esf_date)
-            if not match:
-                raise ValueError(f"Format ESF invalide : {esf_date}")
-
-            timestamp_ms = int(match.group(1))
-            offset_str = match.group(2) or "+0000"
-
-            timestamp_sec = timestamp_ms // 1000
-            date_utc = datetime.utcfromtimestamp(timestamp_sec).replace(tzinfo=timezone.utc)
-
-            offset_hours = int(offset_str[:3])
-            date_adjusted = date_utc + timedelta(hours=offset_hours)
-
-            return date_adjusted.astimezone(self.timezone_paris).strftime("%d/%m/%Y %H:%M:%S")
-
+            return esf_dates.to_french(esf_date)
         except Exception as e:
             raise ValueError(f"Erreur de conversion pour {esf_date} : {str(e)}") from e
 
     def escape_ics_text(self, text):
         """Échappe le texte pour le format ICS"""
-        if not text:
-            return ""
-        # Échapper les caractères spéciaux ICS
-        text = str(text)
-        text = text.replace("\\", "\\\\")
-        text = text.replace(",", "\\,")
-        text = text.replace(";", "\\;")
-        text = text.replace("\n", "\\n")
-        text = text.replace("\r", "")
-        return text
+        return escape_text(text)
 
     def format_datetime_ics(self, dt):
         """Formate une datetime pour le format ICS"""
@@ -95,8 +67,11 @@ class ICSGenerator:
         # Créer un UID stable basé sur l'ih ESF
         return f"esf-{ih}@esf-calendar.local"
 
-    def convert_esf_to_ics_event(self, esf_event, server_time):
-        """Convertit un événement ESF en format ICS"""
+    def convert_esf_to_ics_event(self, esf_event, server_time, created=None):
+        """
+        Convertit un événement ESF en lignes de propriétés VEVENT (None si invalide).
+        created : valeur de CREATED (par défaut la date de modification ESF)
+        """
         try:
             start_dt = self.parse_esf_date(esf_event['dd'])
             end_dt = self.parse_esf_date(esf_event['df'])
@@ -112,25 +87,24 @@ class ICSGenerator:
             # Génération de l'UID unique
             uid = self.generate_uid(esf_event)
 
-            # Création de la description
-            description = f"Niveau Ski: {esf_event.get('lne', 'Inconnu')}\\n"
-            description += f"Niveau Langue: {esf_event.get('lle', 'Non spécifié')} {esf_event.get('nl', '')}\\n"
-            description += f"Ajouté le {add_esf_date} par l'ESF\\n"
-            description += f"Synchronisé le {add_server_date} via le serveur\\n"
+            # Création de la description (les retours à la ligne sont échappés par escape_ics_text)
+            description = f"Niveau Ski: {esf_event.get('lne', 'Inconnu')}\n"
+            description += f"Niveau Langue: {esf_event.get('lle', 'Non spécifié')} {esf_event.get('nl', '')}\n"
+            description += f"Ajouté le {add_esf_date} par l'ESF\n"
+            description += f"Synchronisé le {add_server_date} via le serveur\n"
             description += f"Autres Infos: {esf_event.get('cm', 'Inconnu')}"
 
-            # Timestamp de création/modification (maintenant en UTC)
-            now_utc = datetime.now(timezone.utc)
-            timestamp = now_utc.strftime("%Y%m%dT%H%M%SZ")
+            # Timestamps dérivés de la date de modification ESF (dm) : un cours
+            # inchangé produit exactement les mêmes octets d'un passage à l'autre
+            timestamp = self.format_datetime_ics(self.parse_esf_date(esf_event['dm']))
 
             # Construction de l'événement ICS
             ics_event = []
-            ics_event.append("BEGIN:VEVENT")
             ics_event.append(f"UID:{uid}")
             ics_event.append(f"DTSTART:{self.format_datetime_ics(start_dt)}")
             ics_event.append(f"DTEND:{self.format_datetime_ics(end_dt)}")
             ics_event.append(f"DTSTAMP:{timestamp}")
-            ics_event.append(f"CREATED:{timestamp}")
+            ics_event.append(f"CREATED:{created or timestamp}")
             ics_event.append(f"LAST-MODIFIED:{timestamp}")
             ics_event.append(f"SUMMARY:{self.escape_ics_text(esf_event.get('lp', 'Cours ESF'))}")
             
@@ -141,48 +115,61 @@ class ICSGenerator:
             ics_event.append(f"DESCRIPTION:{self.escape_ics_text(description)}")
             ics_event.append("STATUS:CONFIRMED")
             ics_event.append("TRANSP:OPAQUE")
-            ics_event.append("END:VEVENT")
 
-            return "\n".join(ics_event)
+            return ics_event
 
         except Exception as e:
             logging.error(f"Erreur conversion événement IH={esf_event.get('ih')} : {str(e)}")
             return None
 
-    def generate_ics_calendar(self, esf_events, server_time):
-        """Génère le fichier ICS complet"""
-        try:
-            # En-tête du calendrier ICS
-            ics_lines = [
-                "BEGIN:VCALENDAR",
-                "VERSION:2.0",
-                "PRODID:-//ESF Calendar Generator//ESF Events//FR",
-                "CALSCALE:GREGORIAN",
-                "METHOD:PUBLISH",
-                "X-WR-CALNAME:Calendrier ESF",
-                "X-WR-CALDESC:Événements automatiquement synchronisés depuis l'ESF",
-                "X-WR-TIMEZONE:Europe/Paris"
-            ]
-
-            # Ajout des événements
-            events_added = 0
+    def write_ics_calendar(self, esf_events, server_time, stream, cache=None):
+        """
+        Écrit le calendrier dans un flux binaire (fichier, socket...) : chaque
+        VEVENT est écrit dès sa conversion. Avec un FragmentCache, les cours dont
+        (ih, dm) n'a pas changé sont recopiés sans être reconvertis.
+        Retourne le nombre d'événements écrits.
+        """
+        with ICSWriter(stream, CALENDAR_PROPERTIES) as writer:
             for esf_event in esf_events:
-                ics_event = self.convert_esf_to_ics_event(esf_event, server_time)
-                if ics_event:
-                    ics_lines.append(ics_event)
-                    events_added += 1
-
-            # Fin du calendrier
-            ics_lines.append("END:VCALENDAR")
-
-            # Écriture du fichier
-            ics_content = "\n".join(ics_lines)
-            
-            with open(self.output_filename, 'w', encoding='utf-8') as f:
-                f.write(ics_content)
-
-            logging.info(f"Fichier ICS généré : {self.output_filename}")
+                ih, dm = esf_event.get('ih'), esf_event.get('dm')
+                fragment = cache.get(ih, dm) if cache is not None else None
+                if fragment is None:
+                    created = cache.created(ih, None) if cache is not None else None
+                    ics_event = self.convert_esf_to_ics_event(esf_event, server_time, created)
+                    if not ics_event:
+                        continue
+                    fragment = writer.render_component("VEVENT", ics_event)
+                    if cache is not None:
+                        created = created or self.format_datetime_ics(self.parse_esf_date(dm))
+                        cache.put(ih, dm, created, fragment)
+                writer.write_rendered(fragment)
+        run_metrics.count("items", writer.components)
+        run_metrics.count("bytes_out", writer.bytes)
+        return writer.components
+
+    def generate_ics_calendar(self, esf_events, server_time, cache=None):
+        """
+        Génère le fichier ICS complet dans un fichier temporaire. Si le résultat est
+        identique au fichier existant, celui-ci n'est pas réécrit (sa date de
+        modification ne change pas) ; sinon il est remplacé de manière atomique.
+        """
+        try:
+            with run_metrics.stage("ics_render"):
+                changed, events_added = write_if_changed(
+                    self.output_filename,
+                    lambda stream: self.write_ics_calendar(esf_events, server_time, stream, cache),
+                )
+                run_metrics.count("files_changed", int(changed))
+                if cache is not None:
+                    run_metrics.count("cache_hits", cache.hits)
+
+            if changed:
+                logging.info(f"Fichier ICS généré : {self.output_filename}")
+            else:
+                logging.info(f"Fichier ICS inchangé : {self.output_filename}")
             logging.info(f"Nombre d'événements traités : {events_added}")
+            if cache is not None:
+                logging.info(f"Fragments en cache : {cache.hits} réutilisés, {cache.misses} rendus")
             
             return True
 
@@ -190,7 +177,7 @@ class ICSGenerator:
             logging.error(f"Erreur génération fichier ICS : {str(e)}")
             return False
 
-    def load_and_process_json(self, json_filename="filtered_events.json"):
+    def load_and_process_json(self, json_filename="filtered_events.json", cache=None):
         """Charge et traite le fichier JSON des événements"""
         try:
             if not os.path.exists(json_filename):
@@ -213,7 +200,11 @@ class ICSGenerator:
 
             logging.info(f"Chargement de {len(esf_events)} événements depuis {json_filename}")
             
-            return self.generate_ics_calendar(esf_events, server_time)
+            success = self.generate_ics_calendar(esf_events, server_time, cache)
+            if success and cache is not None:
+                cache.prune()
+                cache.save()
+            return success
 
         except Exception as e:
             logging.error(f"Erreur traitement fichier JSON : {str(e)}")
@@ -229,6 +220,8 @@ def main():
                        help="Fichier JSON d'entrée (défaut: filtered_events.json)")
     parser.add_argument("--output", "-o", default="esf_calendar.ics", 
                        help="Fichier ICS de sortie (défaut: esf_calendar.ics)")
+    parser.add_argument("--no-cache", action="store_true",
+                       help="Reconvertit tous les événements sans utiliser le cache de fragments")
     parser.add_argument("--verbose", "-v", action="store_true", 
                        help="Mode verbose")
     
@@ -238,12 +231,16 @@ def main():
         logging.getLogger().setLevel(logging.DEBUG)
     
     # Génération du fichier ICS
+    run_metrics.start("esf_ics")
     generator = ICSGenerator(args.output)
-    success = generator.load_and_process_json(args.input)
+    cache = None if args.no_cache else FragmentCache()
+    success = generator.load_and_process_json(args.input, cache)
+    run_metrics.current().failed = not success
+    run_metrics.export()
     
     if success:
         print(f"✅ Fichier ICS généré avec succès : {args.output}")
-        print(f"📅 Vous pouvez maintenant vous abonner à ce calendrier via l'URL du fichier")
+        print(f"📅 Pour s'abonner au calendrier : python3 scripts/ics_server.py --dir {os.path.dirname(os.path.abspath(args.output))}")
         return 0
     else:
         print("❌ Erreur lors de la génération du fichier ICS")
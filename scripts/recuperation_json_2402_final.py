@@ -1,72 +1,299 @@
-from datetime import datetime, timezone
-from playwright.sync_api import sync_playwright
+from datetime import datetime, timezone, timedelta
+import asyncio
 import json
 from dotenv import load_dotenv
 import os
+from esf_session import open_session, save_storage_state, load_storage_state, write_storage_state
+from esf_http import SessionExpired, dump_cookies, get_http_session, load_cookies, post_planning
+from esf_dates import format_esf_date
+import run_metrics
 
 load_dotenv()
 
 username = os.getenv("ESF_USERNAME")
 password = os.getenv("ESF_PASSWORD")
 
-def get_esf_events():
+# "http" : appel direct de l'API avec les cookies sauvegardés (navigateur seulement pour les renouveler)
+# "browser" : interception de la requête dans Chromium
+FETCH_MODE = os.getenv("ESF_FETCH_MODE", "http")
+
+TARGET_URL = "AjaxProxyService.svc/InvokeMethod?IPlanningParticulierServicePublic&GetListeHorairesMoniteur"
+PLANNING_URL = os.getenv(
+    "ESF_PLANNING_URL",
+    "https://esf{ecole}.w-esf.com/PlanningParticulierSSO/PlanningParticulier.aspx?NoEcole={ecole}&disable-logout=true",
+)
+# Délai maximal d'attente de la réponse planning en mode navigateur (ms)
+RESPONSE_TIMEOUT_MS = int(os.getenv("ESF_RESPONSE_TIMEOUT_MS", "30000"))
+API_URL = os.getenv("ESF_API_URL", f"https://esf{{ecole}}.w-esf.com/PlanningParticulierSSO/{TARGET_URL}")
+
+# Liste des écoles / moniteurs à synchroniser (voir load_sources)
+SOURCES_FILE = os.getenv("ESF_SOURCES_FILE", "config/esf_sources.json")
+# Nombre de moniteurs regroupés dans un même idTecMoniteurList
+BATCH_SIZE = int(os.getenv("ESF_BATCH_SIZE", "10"))
+# Nombre maximal de requêtes simultanées vers l'ESF
+MAX_WORKERS = int(os.getenv("ESF_MAX_WORKERS", "4"))
+
+# Fin de la période récupérée (AAAA-MM-JJ) ; par défaut la fin de saison (30 avril)
+HORIZON_END = os.getenv("ESF_HORIZON_END")
+# Découpage de la période : "week", "month" ou un nombre de jours
+WINDOW = os.getenv("ESF_WINDOW", "month")
+# Nouvelles tentatives pour une fenêtre en échec (hors session expirée)
+WINDOW_RETRIES = int(os.getenv("ESF_WINDOW_RETRIES", "2"))
+
+DEFAULT_SOURCE = {
+    "NoEcole": "356",
+    "IdComSaison": "63",
+    "IdGenPosteTechnique": "6862462",
+    "moniteurs": ["19358136"],
+}
+
+# storage_state dont les cookies sont chargés dans la session HTTP (None : pas encore lu)
+_storage_state = None
+
+
+def load_sources(path=SOURCES_FILE):
+    """
+    Charge la liste des écoles et moniteurs à synchroniser.
+    Format : [{"NoEcole": "356", "IdComSaison": "63", "IdGenPosteTechnique": "6862462",
+               "moniteurs": ["19358136", ...]}, ...]
+    Sans fichier, seule la configuration historique (école 356) est utilisée.
+    """
+    if not os.path.exists(path):
+        return [DEFAULT_SOURCE]
+    with open(path, "r", encoding="utf-8") as f:
+        sources = json.load(f)
+    return [{**DEFAULT_SOURCE, **source} for source in sources]
+
+
+def get_horizon(now=None):
+    """Retourne la période (début, fin) à récupérer"""
+    # start_date = datetime(2025, 2, 16, tzinfo=timezone.utc)
+    start_date = now or datetime.now(timezone.utc)
+    if HORIZON_END:
+        end_date = datetime.fromisoformat(HORIZON_END).replace(tzinfo=timezone.utc)
+    else:
+        # Fin de saison : le prochain 30 avril
+        end_date = datetime(start_date.year, 4, 30, tzinfo=timezone.utc)
+        if end_date <= start_date:
+            end_date = end_date.replace(year=start_date.year + 1)
+    return start_date, end_date
+
+
+def split_windows(start_date, end_date, window=WINDOW):
+    """Découpe [start_date, end_date[ en fenêtres d'une semaine, d'un mois ou de N jours"""
+    windows = []
+    current = start_date
+    while current < end_date:
+        if window == "month":
+            # Fenêtre jusqu'au 1er du mois suivant
+            month_start = current.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            if month_start.month == 12:
+                next_start = month_start.replace(year=month_start.year + 1, month=1)
+            else:
+                next_start = month_start.replace(month=month_start.month + 1)
+        else:
+            days = 7 if window == "week" else int(window)
+            next_start = current + timedelta(days=days)
+        next_start = min(next_start, end_date)
+        windows.append((current, next_start))
+        current = next_start
+    return windows
+
+
+def build_payload(source=DEFAULT_SOURCE, moniteurs=None, start_date=None, end_date=None, reference_delta=None):
+    """
+    Construit le corps de la requête GetListeHorairesMoniteur.
+    reference_delta (date ESF /Date(...)/) limite la réponse aux changements depuis cette date.
+    """
+    if start_date is None or end_date is None:
+        start_date, end_date = get_horizon()
+    if moniteurs is None:
+        moniteurs = source["moniteurs"]
+    return {
+        "serviceContract": "IPlanningParticulierServicePublic",
+        "serviceMethod": "GetListeHorairesMoniteur",
+        "methodParams": json.dumps({
+            "typeLibelle": "1",
+            "language": "1",
+            "IdGenCaisse": "0",
+            "IdGenPosteTechnique": str(source["IdGenPosteTechnique"]),
+            "IdComLangue": "1",
+            "IdComSaison": str(source["IdComSaison"]),
+            "NoEcole": str(source["NoEcole"]),
+            "CodeUc": "TECH-UC002-M",
+            "CodeApplication": "PLANNING-PARTICULIER-MONITEUR",
+            "idTecHoraire": "0",
+            "idTecMoniteur": "0",
+            "CodeTypePosteTechnique": "MON",
+            "end": "end",
+            "idTecMoniteurList": [str(m) for m in moniteurs],
+            "dateHeureDebut": format_esf_date(start_date),
+            "dateHeureFin": format_esf_date(end_date),
+            "dateReferenceDelta": reference_delta
+        }).replace(" ", "")
+    }
+
+
+def refresh_session_cookies(sources=None):
+    """
+    Lance Chromium uniquement pour (re)générer les cookies de session,
+    y compris ceux des domaines esfNNN.w-esf.com obtenus via le SSO.
+    """
+    from playwright.sync_api import sync_playwright
+
+    sources = sources or [DEFAULT_SOURCE]
+    with run_metrics.stage("login"), sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context, page = open_session(browser, username, password)
+        for ecole in {str(source["NoEcole"]) for source in sources}:
+            page.goto(PLANNING_URL.format(ecole=ecole))
+        state = save_storage_state(context)
+        browser.close()
+    print("Cookies de session ESF renouvelés.")
+    return state
+
+
+def build_jobs(sources, windows=None, reference_delta=None):
+    """
+    Découpe les moniteurs de chaque école en lots d'au plus BATCH_SIZE,
+    et la période en fenêtres (une requête par lot et par fenêtre)
+    """
+    windows = windows or split_windows(*get_horizon())
+    jobs = []
+    for source in sources:
+        ecole = str(source["NoEcole"])
+        moniteurs = source["moniteurs"]
+        for i in range(0, len(moniteurs), BATCH_SIZE):
+            for start_date, end_date in windows:
+                jobs.append({
+                    "api_url": API_URL.format(ecole=ecole),
+                    "referer": PLANNING_URL.format(ecole=ecole),
+                    "payload": build_payload(source, moniteurs[i:i + BATCH_SIZE], start_date, end_date, reference_delta),
+                    "window": (start_date, end_date),
+                })
+    return jobs
+
+
+async def run_jobs(jobs, max_workers=MAX_WORKERS, retries=WINDOW_RETRIES):
+    """
+    Exécute les requêtes en parallèle, au plus max_workers à la fois.
+    Une fenêtre en échec est retentée seule, sans relancer toute la période.
+    """
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def run(job):
+        for attempt in range(retries + 1):
+            try:
+                async with semaphore:
+                    return await asyncio.to_thread(post_planning, job["api_url"], job["payload"], job["referer"])
+            except SessionExpired:
+                raise
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                start_date, end_date = job["window"]
+                print(f"Fenêtre {start_date:%d/%m/%Y}-{end_date:%d/%m/%Y} en échec ({e}), nouvelle tentative...")
+                await asyncio.sleep(2 ** attempt)
+
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+
+def is_planning(response):
+    """Vrai si la réponse est un planning (liste Items), et non une erreur ou une page HTML"""
+    return isinstance(response, dict) and isinstance(response.get("Items"), list)
+
+
+def merge_responses(responses):
+    """
+    Fusionne plusieurs réponses GetListeHorairesMoniteur (dédoublonnage sur ih).
+    Si une école ou une fenêtre n'a pas renvoyé de planning, le résultat est marqué
+    Incomplete : l'import ne supprime alors aucun cours.
+    """
+    items = {}
+    server_time = None
+    missing = 0
+    for response in responses:
+        if not is_planning(response):
+            missing += 1
+            continue
+        for item in response["Items"]:
+            items[item["ih"]] = item
+        server_time = server_time or response.get("ServerTime")
+    merged = {
+        "Page": 0,
+        "Pages": 0,
+        "Total": len(items),
+        "ServerTime": server_time,
+        "Items": list(items.values()),
+    }
+    if missing:
+        print(f"{missing} réponse(s) sur {len(responses)} sans planning, récupération incomplète")
+        merged["Incomplete"] = True
+    return merged
+
+
+def get_esf_events_http(sources=None, reference_delta=None):
+    """
+    Récupère le planning par des POST directs, sans navigateur si la session est valide.
+    Les cookies ne sont lus sur disque qu'au premier appel : les passages suivants
+    réutilisent ceux de la session HTTP, renouvelés par le serveur au fil des requêtes.
+    """
+    global _storage_state
+    sources = sources or load_sources()
+    session = get_http_session(pool_size=MAX_WORKERS)
+    if _storage_state is None:
+        _storage_state = load_storage_state() or refresh_session_cookies(sources)
+        load_cookies(session, _storage_state)
+
+    jobs = build_jobs(sources, reference_delta=reference_delta)
+    try:
+        responses = asyncio.run(run_jobs(jobs))
+    except SessionExpired as e:
+        print(f"Session ESF expirée ({e}), renouvellement des cookies...")
+        _storage_state = refresh_session_cookies(sources)
+        load_cookies(session, _storage_state)
+        responses = asyncio.run(run_jobs(jobs))
+    persist_cookies(session)
+    return merge_responses(responses)
+
+
+def persist_cookies(session):
+    """Sauvegarde les cookies de la session HTTP s'ils ont changé depuis le dernier passage"""
+    global _storage_state
+    state = dump_cookies(session, _storage_state)
+
+    def values(s):
+        return {(c["name"], c.get("domain"), c.get("path", "/")): c["value"] for c in s.get("cookies", [])}
+
+    if values(state) != values(_storage_state):
+        _storage_state = write_storage_state(state)
+
+
+def get_esf_events_browser(source=DEFAULT_SOURCE, timeout_ms=RESPONSE_TIMEOUT_MS, reference_delta=None):
+    """
+    Récupère le planning d'une école en interceptant la requête dans Chromium.
+    Lève TimeoutError si la réponse n'arrive pas dans les timeout_ms millisecondes.
+    """
+    from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
-        context = browser.new_context()
-        page = context.new_page()
+
+        # Étape 1: Connexion (ou réutilisation de la session sauvegardée)
+        with run_metrics.stage("login"):
+            context, page = open_session(browser, username, password)
 
         # Activation du logging des requêtes
         # page.on("request", lambda req: print(f">> {req.method} {req.url}"))
         # page.on("response", lambda res: print(f"<< {res.status} {res.url}"))
 
-        print("Navigating to login page...")
-        # Étape 1: Connexion
-        page.goto("https://carnet-rouge-esf.app/")
-        page.click('a[title="Connexion"]')
-        page.wait_for_url("https://identity.w-esf.com/**")
-        page.fill("#LoginVM_Login", username)
-        page.fill("#LoginVM_MotDePasse", password)
-        page.click('button[type="submit"]')
-        page.wait_for_url("https://carnet-rouge-esf.app/**")
-        print("Logged in successfully.")
-
-        # Variables pour le tracking des requêtes
-        target_url = "AjaxProxyService.svc/InvokeMethod?IPlanningParticulierServicePublic&GetListeHorairesMoniteur"
-        response_data = {"body": None}
-
         # Intercepteur de requêtes
         def intercept_route(route, request):
-            if request.method == "POST" and target_url in request.url:
+            if request.method == "POST" and TARGET_URL in request.url:
                 print("\n--- INTERCEPTION DE LA REQUÊTE POST ---")
 
                 # Construction du payload
-                # start_date = datetime(2025, 2, 16, tzinfo=timezone.utc)
-                start_date = datetime.now(timezone.utc)
-                # start_date = datetime(2025, 3, 3, tzinfo=timezone.utc)
-                end_date = datetime(2025, 4, 30, tzinfo=timezone.utc)
-                payload = {
-                    "serviceContract": "IPlanningParticulierServicePublic",
-                    "serviceMethod": "GetListeHorairesMoniteur",
-                    "methodParams": json.dumps({
-                        "typeLibelle": "1",
-                        "language": "1",
-                        "IdGenCaisse": "0",
-                        "IdGenPosteTechnique": "6862462",
-                        "IdComLangue": "1",
-                        "IdComSaison": "63",
-                        "NoEcole": "356",
-                        "CodeUc": "TECH-UC002-M",
-                        "CodeApplication": "PLANNING-PARTICULIER-MONITEUR",
-                        "idTecHoraire": "0",
-                        "idTecMoniteur": "0",
-                        "CodeTypePosteTechnique": "MON",
-                        "end": "end",
-                        "idTecMoniteurList": ["19358136"],
-                        "dateHeureDebut": f"/Date({int(start_date.timestamp() * 1000)}+0000)/",
-                        "dateHeureFin": f"/Date({int(end_date.timestamp() * 1000)}+0000)/",
-                        "dateReferenceDelta": None
-                    }).replace(" ", "")
-                }
+                payload = build_payload(source, reference_delta=reference_delta)
 
                 print("Payload envoyé:", json.dumps(payload, indent=2))
 
@@ -80,49 +307,85 @@ def get_esf_events():
                     }
                 )
 
-                # Capture de la réponse associée
-                def handle_response(response):
-                    if response.request == request:
-                        try:
-                            response_data["body"] = response.json()
-                            print("Réponse capturée avec succès!")
-                        except Exception as e:
-                            print(f"Erreur de lecture: {e}")
-                            response_data["body"] = response.text()
-
-                page.on("response", handle_response)
-
             else:
                 route.continue_()
 
+        def is_target_response(response):
+            return response.request.method == "POST" and TARGET_URL in response.url
+
         # Activation de l'interception
-        page.route(f"**/*{target_url}*", intercept_route)
+        page.route(f"**/*{TARGET_URL}*", intercept_route)
 
         print("Navigating to target page...")
-        # Déclenchement de la navigation
-        page.goto("https://esf356.w-esf.com/PlanningParticulierSSO/PlanningParticulier.aspx?NoEcole=356&disable-logout=true")
-
-        # Attente explicite pour la réponse
-        page.wait_for_timeout(10000)
-        print("Waited for response.")
-
-        # Extraction des données
-        events = response_data.get("body")
-        #print("Events data:", events)
-        if events:
-            with open("events.json", "w") as f:
-                json.dump(events, f, indent=4)
-            print("Événements sauvegardés dans events.json!")
-        else:
-            print("Aucune donnée récupérée")
+        # Déclenchement de la navigation : on rend la main dès que la réponse
+        # ciblée est reçue, sans attendre la fin du chargement de la page
+        try:
+            with page.expect_response(is_target_response, timeout=timeout_ms) as response_info:
+                page.goto(PLANNING_URL.format(ecole=source["NoEcole"]), wait_until="commit")
+            response = response_info.value
+        except PlaywrightTimeoutError as e:
+            browser.close()
+            raise TimeoutError(
+                f"Aucune réponse GetListeHorairesMoniteur reçue après {timeout_ms} ms"
+            ) from e
 
+        # Capture de la réponse
+        body = response.body()
+        run_metrics.count("requests")
+        run_metrics.count("bytes_in", len(body))
+        try:
+            events = json.loads(body)
+            print("Réponse capturée avec succès!")
+        except Exception as e:
+            print(f"Erreur de lecture: {e}")
+            events = body.decode("utf-8", errors="replace")
+
+        # Les cookies ont pu être renouvelés pendant la navigation
+        save_storage_state(context)
         browser.close()
         return events
 
-# Exécution
-events = get_esf_events()
-if events:
-    print("il a y a bien eu la recuperation")
-    #print(json.dumps(events, indent=4))
-else:
-    print("Échec de la récupération")
+
+def get_esf_events(output_file=None, mode=None, reference_delta=None):
+    """
+    Récupère le planning ESF et le retourne sous forme de dict (Page, Pages, Items...).
+    Si output_file est fourni, une copie est sauvegardée sur disque.
+    Avec reference_delta, seuls les changements depuis cette date ESF sont demandés.
+    """
+    mode = mode or FETCH_MODE
+    sources = load_sources()
+    start_date, end_date = get_horizon()
+    events = None
+    if mode == "http":
+        try:
+            events = get_esf_events_http(sources, reference_delta)
+        except Exception as e:
+            print(f"Échec de la récupération HTTP ({e}), repli sur le navigateur")
+    if events is None:
+        # Un navigateur par école : le mode navigateur reste séquentiel
+        responses = [get_esf_events_browser(source, reference_delta=reference_delta) for source in sources]
+        events = merge_responses(responses) if any(map(is_planning, responses)) else None
+
+    # Extraction des données
+    #print("Events data:", events)
+    if events:
+        # Période demandée : l'import peut supprimer les cours disparus de cette période
+        events["DateDebut"] = format_esf_date(start_date)
+        events["DateFin"] = format_esf_date(end_date)
+        if output_file:
+            with open(output_file, "w") as f:
+                json.dump(events, f, indent=4)
+            print(f"Événements sauvegardés dans {output_file}!")
+    else:
+        print("Aucune donnée récupérée")
+    return events
+
+
+if __name__ == "__main__":
+    # Exécution
+    events = get_esf_events("events.json")
+    if events:
+        print("il a y a bien eu la recuperation")
+        #print(json.dumps(events, indent=4))
+    else:
+        print("Échec de la récupération")
@@ -0,0 +1,187 @@
+"""
+Mesures d'un passage : durée, compteurs et pic mémoire de chaque étape
+(login, fetch, filter, diff, write, ics_render...).
+
+    with run_metrics.stage("filter"):
+        ...
+        run_metrics.count("items", len(items))
+
+Les compteurs sont rattachés à l'étape en cours (y compris depuis les threads
+lancés pendant l'étape) ; les totaux du passage sont tenus par étape sous la clé
+"<étape>.<compteur>" (ex : fetch.items, write.api_calls). export() écrit dans ESF_METRICS_DIR (défaut : metrics/) :
+  - <job>.json : rapport complet du dernier passage
+  - <job>.prom : format texte Prometheus (pour le textfile collector de node_exporter)
+ESF_PROFILE="fetch,diff" (ou "all") enregistre un profil cProfile par étape
+dans ESF_METRICS_DIR/profiles/<job>-<étape>.prof (lecture : python -m pstats).
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin racine
+
+METRICS_DIR = os.getenv("ESF_METRICS_DIR", os.path.join(BASE_DIR, "metrics"))
+PROFILE = {s.strip() for s in os.getenv("ESF_PROFILE", "").split(",") if s.strip()}
+
+
+def peak_rss_bytes():
+    """Pic de mémoire résidente du processus (None si indisponible)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : kilo-octets ; macOS : octets
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RunMetrics:
+    """Étapes et compteurs d'un passage"""
+
+    def __init__(self, job="esf_sync"):
+        self.job = job
+        self.started = time.time()
+        self.stages = []
+        self.totals = {}
+        self.stack = []
+        self.lock = threading.Lock()
+        self.profiling = False
+        self.failed = False
+
+    @contextmanager
+    def stage(self, name):
+        record = {
+            "stage": name,
+            "parent": self.stack[-1]["stage"] if self.stack else None,
+            "started": round(time.time(), 3),
+            "counters": {},
+            "status": "ok",
+        }
+        profiler = None
+        if (name in PROFILE or "all" in PROFILE) and not self.profiling:
+            # Un seul profileur actif à la fois : les étapes imbriquées sont incluses dans le profil parent
+            profiler = cProfile.Profile()
+            self.profiling = True
+            profiler.enable()
+        self.stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record["status"] = "error"
+            self.failed = True
+            raise
+        finally:
+            record["duration"] = round(time.perf_counter() - start, 6)
+            record["peak_rss"] = peak_rss_bytes()
+            self.stack.remove(record)
+            if profiler is not None:
+                profiler.disable()
+                self.profiling = False
+                os.makedirs(os.path.join(METRICS_DIR, "profiles"), exist_ok=True)
+                profiler.dump_stats(os.path.join(METRICS_DIR, "profiles", f"{self.job}-{name}.prof"))
+            with self.lock:
+                self.stages.append(record)
+
+    def count(self, key, value=1):
+        """Ajoute value au compteur key de l'étape en cours et au total <étape>.<key> du passage"""
+        with self.lock:
+            if self.stack:
+                counters = self.stack[-1]["counters"]
+                counters[key] = counters.get(key, 0) + value
+                key = f"{self.stack[-1]['stage']}.{key}"
+            self.totals[key] = self.totals.get(key, 0) + value
+
+    def report(self):
+        return {
+            "job": self.job,
+            "started": round(self.started, 3),
+            "duration": round(time.time() - self.started, 6),
+            "status": "error" if self.failed else "ok",
+            "peak_rss": peak_rss_bytes(),
+            "totals": dict(self.totals),
+            "stages": list(self.stages),
+        }
+
+    def prometheus(self):
+        """Rapport au format texte Prometheus"""
+        report = self.report()
+        job = self.job
+        durations, counters = {}, {}
+        for s in report["stages"]:
+            durations[s["stage"]] = durations.get(s["stage"], 0) + s["duration"]
+            for key, value in s["counters"].items():
+                counters[(s["stage"], key)] = counters.get((s["stage"], key), 0) + value
+        lines = [
+            "# HELP esf_run_duration_seconds Durée totale du dernier passage",
+            "# TYPE esf_run_duration_seconds gauge",
+            f'esf_run_duration_seconds{{job="{job}"}} {report["duration"]}',
+            "# HELP esf_run_success 1 si le dernier passage s'est terminé sans erreur",
+            "# TYPE esf_run_success gauge",
+            f'esf_run_success{{job="{job}"}} {0 if self.failed else 1}',
+            "# HELP esf_run_timestamp_seconds Début du dernier passage",
+            "# TYPE esf_run_timestamp_seconds gauge",
+            f'esf_run_timestamp_seconds{{job="{job}"}} {report["started"]}',
+            "# HELP esf_stage_duration_seconds Durée de chaque étape du dernier passage",
+            "# TYPE esf_stage_duration_seconds gauge",
+        ]
+        lines += [f'esf_stage_duration_seconds{{job="{job}",stage="{stage}"}} {round(value, 6)}'
+                  for stage, value in durations.items()]
+        lines += [
+            "# HELP esf_stage_count Compteurs de chaque étape du dernier passage (éléments, appels, octets...)",
+            "# TYPE esf_stage_count gauge",
+        ]
+        lines += [f'esf_stage_count{{job="{job}",stage="{stage}",counter="{key}"}} {value}'
+                  for (stage, key), value in counters.items()]
+        if report["peak_rss"] is not None:
+            lines += [
+                "# HELP esf_run_peak_rss_bytes Pic de mémoire résidente du processus",
+                "# TYPE esf_run_peak_rss_bytes gauge",
+                f'esf_run_peak_rss_bytes{{job="{job}"}} {report["peak_rss"]}',
+            ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory=METRICS_DIR):
+        """Écrit <job>.json et <job>.prom (remplacement atomique)"""
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        for ext, content in (("json", json.dumps(self.report(), ensure_ascii=False, indent=2)),
+                             ("prom", self.prometheus())):
+            path = os.path.join(directory, f"{self.job}.{ext}")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+
+
+_run = RunMetrics()
+
+
+def start(job):
+    """Démarre un nouveau passage (remplace les mesures en cours)"""
+    global _run
+    _run = RunMetrics(job)
+    return _run
+
+
+def current():
+    return _run
+
+
+def stage(name):
+    return _run.stage(name)
+
+
+def count(key, value=1):
+    _run.count(key, value)
+
+
+def export(directory=METRICS_DIR):
+    _run.export(directory)
@@ -0,0 +1,158 @@
+"""
+Index local (SQLite) des événements ESF déjà synchronisés.
+Associe chaque ih ESF à l'id de l'événement Google, à une empreinte du contenu
+et au dernier dm connu : la comparaison avec le calendrier devient une simple
+recherche locale, le listing complet de Google n'étant utilisé que pour une
+réconciliation périodique.
+"""
+import os
+import sqlite3
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin racine
+
+STATE_DB = os.getenv("ESF_SYNC_DB", os.path.join(BASE_DIR, "config", "sync_state.db"))
+# Intervalle entre deux réconciliations avec le calendrier distant (heures)
+RECONCILE_HOURS = float(os.getenv("ESF_RECONCILE_HOURS", "24"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    ih TEXT PRIMARY KEY,
+    google_id TEXT NOT NULL,
+    content_hash TEXT,
+    dm TEXT,
+    start REAL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SyncState:
+    def __init__(self, path=STATE_DB):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, ih):
+        """Retourne (google_id, content_hash, dm) ou None"""
+        return self.conn.execute(
+            "SELECT google_id, content_hash, dm FROM events WHERE ih = ?", (str(ih),)
+        ).fetchone()
+
+    def known_ihs(self):
+        return {row[0] for row in self.conn.execute("SELECT ih FROM events")}
+
+    def all(self):
+        """Retourne {ih: (google_id, content_hash, dm)}"""
+        return {
+            row[0]: row[1:]
+            for row in self.conn.execute("SELECT ih, google_id, content_hash, dm FROM events")
+        }
+
+    def upsert(self, ih, google_id, content_hash=None, dm=None, start=None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO events (ih, google_id, content_hash, dm, start, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(ih) DO UPDATE SET google_id = excluded.google_id, "
+                "content_hash = excluded.content_hash, dm = excluded.dm, start = excluded.start, "
+                "updated_at = excluded.updated_at",
+                (str(ih), google_id, content_hash, dm, start, time.time()),
+            )
+
+    def delete(self, ih):
+        with self.conn:
+            self.conn.execute("DELETE FROM events WHERE ih = ?", (str(ih),))
+
+    def delete_by_google_id(self, google_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM events WHERE google_id = ?", (google_id,))
+
+    def in_window(self, time_min=None, time_max=None):
+        """Retourne {ih: google_id} des événements débutant dans [time_min, time_max[ (epoch)"""
+        return dict(self.conn.execute(
+            "SELECT ih, google_id FROM events WHERE start >= ? AND start < ?",
+            (time_min if time_min is not None else float("-inf"),
+             time_max if time_max is not None else float("inf")),
+        ))
+
+    def apply_remote(self, ih, google_id, start=None, content_hash=None):
+        """
+        Enregistre un événement vu dans le calendrier.
+        L'empreinte lue dans le calendrier (esf_hash) est prioritaire ;
+        à défaut, celle de l'index est conservée si l'id ne change pas.
+        """
+        row = self.get(ih)
+        if row and row[0] == google_id:
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE events SET start = COALESCE(?, start), content_hash = COALESCE(?, content_hash) "
+                    "WHERE ih = ?",
+                    (start, content_hash, str(ih)),
+                )
+            return
+        self.upsert(ih, google_id, content_hash, start=start)
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def needs_reconciliation(self, interval_hours=RECONCILE_HOURS):
+        last = self.get_meta("last_reconciliation")
+        return last is None or time.time() - float(last) > interval_hours * 3600
+
+    def reconcile(self, remote, time_min=None, time_max=None):
+        """
+        Aligne l'index sur le calendrier distant ({ih: (google_id, début epoch, empreinte)}).
+        Les empreintes des événements toujours présents sont conservées ;
+        ceux supprimés du calendrier sont retirés (ils seront donc recréés).
+        Si le listing était borné à [time_min, time_max[ (epoch), seuls les
+        événements locaux de cette période peuvent être retirés.
+        """
+        if time_min is None and time_max is None:
+            local = self.known_ihs()
+        else:
+            local = {
+                row[0] for row in self.conn.execute(
+                    "SELECT ih FROM events WHERE start IS NULL OR (start >= ? AND start < ?)",
+                    (time_min if time_min is not None else float("-inf"),
+                     time_max if time_max is not None else float("inf")),
+                )
+            }
+        known = self.all()
+        now = time.time()
+        # Une seule transaction pour tout le listing
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM events WHERE ih = ?", [(ih,) for ih in local - remote.keys()]
+            )
+            for ih, (google_id, start, content_hash) in remote.items():
+                row = known.get(ih)
+                if row and row[0] == google_id:
+                    self.conn.execute(
+                        "UPDATE events SET start = COALESCE(?, start), "
+                        "content_hash = COALESCE(?, content_hash) WHERE ih = ?",
+                        (start, content_hash, ih),
+                    )
+                else:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO events (ih, google_id, content_hash, dm, start, updated_at) "
+                        "VALUES (?, ?, ?, NULL, ?, ?)",
+                        (ih, google_id, content_hash, start, now),
+                    )
+        self.set_meta("last_reconciliation", str(time.time()))
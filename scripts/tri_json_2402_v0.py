@@ -1,37 +1,114 @@
 import json
 import os
 
+from json_stream import iter_payload
+from filter_rules import load_rules
+
 # Chemin des fichiers (à adapter)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin racine
 
 input_file = os.path.join(BASE_DIR, "events.json")
 output_file = os.path.join(BASE_DIR, "filtered_events.json")
 
-# Charger les données
-with open(input_file, 'r', encoding='utf-8') as f:
-    data = json.load(f)
-
-# Définir les valeurs à exclure
-excluded_cp = {"ABSENT", "ABSENCEMONO"}
-excluded_lp = {"ABSENT", "ABSENCE MONO"}
-
-# Filtrer les éléments
-filtered_items = [
-    item for item in data["Items"]
-    if (item["cp"] not in excluded_cp) and (item["lp"] not in excluded_lp)
-]
-
-# Créer la structure de sortie
-result = {
-    "Page": data["Page"],
-    "Pages": data["Pages"],
-    "Total": len(filtered_items),  # Mise à jour du total filtré
-    "ServerTime": data["ServerTime"],  # Ajout de la valeur ServerTime
-    "Items": filtered_items
-}
-
-# Sauvegarder les résultats
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump(result, f, indent=4, ensure_ascii=False)
-
-print(f"{len(filtered_items)} éléments filtrés sauvegardés dans {output_file}")
+# Règles de filtrage (par défaut : exclusion des absences, voir filter_rules.py)
+rules_file = os.getenv("ESF_FILTER_RULES", os.path.join(BASE_DIR, "config", "filter_rules.json"))
+
+
+def get_rules(path=None):
+    """Compile les règles du fichier donné, ou du fichier par défaut s'il existe"""
+    path = path or (rules_file if os.path.exists(rules_file) else None)
+    return load_rules(path)
+
+
+def filter_events(data, rules=None):
+    """
+    Filtre les événements selon les règles et retourne la structure attendue par l'import.
+    En mode incrémental, Items ne contient que les événements modifiés : ceux que les
+    règles écartent désormais (ex : cours passé en ABSENT) sont ajoutés à Removed pour
+    être retirés du calendrier.
+    """
+    is_kept = rules or get_rules()
+
+    # Filtrer les éléments
+    filtered_items = []
+    rejected = []
+    for item in data["Items"]:
+        (filtered_items if is_kept(item) else rejected).append(item)
+    extra = {}
+    if data.get("Incremental") and rejected:
+        extra["Removed"] = list(data.get("Removed", [])) + [str(item["ih"]) for item in rejected]
+
+    # Créer la structure de sortie (les autres clés, ex : Removed, sont conservées)
+    return {
+        **data,
+        **extra,
+        "Page": data["Page"],
+        "Pages": data["Pages"],
+        "Total": len(filtered_items),  # Mise à jour du total filtré
+        "ServerTime": data["ServerTime"],  # Ajout de la valeur ServerTime
+        "Items": filtered_items
+    }
+
+
+def iter_filtered_items(f, meta, is_kept, rejected=None):
+    """
+    Lit le planning au fil de l'eau et génère les éléments conservés par is_kept.
+    Les clés hors Items (Page, Pages, ServerTime, Removed...) sont recueillies dans
+    meta, et l'ih des éléments écartés ajouté à rejected s'il est fourni.
+    """
+    for kind, value in iter_payload(f):
+        if kind == "item":
+            if is_kept(value):
+                yield value
+            elif rejected is not None:
+                rejected.append(str(value["ih"]))
+        else:
+            key, meta_value = value
+            meta[key] = meta_value
+
+
+def stream_filter(input_path, output_path, rules=None):
+    """
+    Filtre input_path vers output_path sans charger le fichier en mémoire.
+    La sortie est compacte ; les métadonnées sont écrites après Items car elles
+    peuvent suivre Items dans l'entrée. Comme filter_events, toutes les clés hors
+    Items sont conservées et, en mode incrémental, les ih écartés ajoutés à Removed.
+    """
+    is_kept = rules or get_rules()
+    meta = {}
+    rejected = []
+    total = 0
+    with open(input_path, 'r', encoding='utf-8') as f_in, open(output_path, 'w', encoding='utf-8') as f_out:
+        f_out.write('{"Items":[')
+        for item in iter_filtered_items(f_in, meta, is_kept, rejected):
+            if total:
+                f_out.write(",")
+            f_out.write(json.dumps(item, ensure_ascii=False, separators=(",", ":")))
+            total += 1
+        f_out.write("]")
+        if meta.get("Incremental") and rejected:
+            meta["Removed"] = list(meta.get("Removed", [])) + rejected
+        meta["Total"] = total
+        for key, value in meta.items():
+            f_out.write(f",{json.dumps(key)}:{json.dumps(value, ensure_ascii=False, separators=(',', ':'))}")
+        f_out.write("}")
+    return total
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Filtre le planning ESF selon un fichier de règles")
+    parser.add_argument("--input", "-i", default=input_file, help="Planning ESF (défaut: events.json)")
+    parser.add_argument("--output", "-o", default=output_file, help="Fichier filtré (défaut: filtered_events.json)")
+    parser.add_argument("--rules", "-r", default=None, help="Fichier de règles JSON (défaut: config/filter_rules.json)")
+    args = parser.parse_args()
+
+    rules = get_rules(args.rules)
+    total = stream_filter(args.input, args.output, rules)
+    print(f"{total} éléments filtrés sauvegardés dans {args.output}")
+    rules.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Nettoyage des calendriers découpés : un calendrier sans cours est supprimé, sauf
+si la plupart des événements n'ont pas pu être rendus (le planning n'a alors rien
+à voir avec leur absence).
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import ics_shards  # noqa: E402
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def esf_date(dt):
+    return f"/Date({int(dt.timestamp() * 1000)}+0100)/"
+
+
+def lesson(ih, im, valid=True):
+    start = NOW + timedelta(days=2)
+    event = {"ih": ih, "im": im, "nm": f"Moniteur {im}", "lp": "COURS PRIVE", "llr": "Front de neige",
+             "dd": esf_date(start), "df": esf_date(start + timedelta(hours=1)), "dm": esf_date(NOW)}
+    if not valid:
+        del event["dd"]
+    return event
+
+
+class PruneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.stale = os.path.join(self.tmp.name, "im-99.ics")
+        with open(self.stale, "w", encoding="utf-8") as f:
+            f.write("BEGIN:VCALENDAR\r\nEND:VCALENDAR\r\n")
+
+    def write(self, events):
+        return ics_shards.write_shards(events, esf_date(NOW), ("im",), self.tmp.name, workers=1)
+
+    def test_stale_calendar_is_removed(self):
+        results = self.write([lesson(1, 7), lesson(2, 7)])
+        self.assertEqual(set(results), {"im-7.ics"})
+        self.assertFalse(os.path.exists(self.stale))
+
+    def test_calendars_are_kept_when_rendering_fails(self):
+        self.write([lesson(1, 7, valid=False), lesson(2, 8, valid=False)])
+        self.assertTrue(os.path.exists(self.stale))
+        self.write([lesson(1, 7), lesson(2, 8, valid=False), lesson(3, 8, valid=False)])
+        self.assertTrue(os.path.exists(self.stale))
+
+
+if __name__ == "__main__":
+    unittest.main()
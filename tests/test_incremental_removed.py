@@ -0,0 +1,89 @@
+"""
+Suppressions en mode incrémental : un cours qui disparaît de la réponse ESF parce
+qu'il a commencé (l'ESF ne renvoie que dd >= DateDebut) ne doit pas être supprimé
+du calendrier ; un cours futur absent de la réponse, si.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+os.environ.setdefault("CALENDAR_ID", "test")
+
+from esf_incremental import select_changes  # noqa: E402
+from filter_rules import load_rules  # noqa: E402
+from import_cal_et_gen_mail_v1 import plan_changes  # noqa: E402
+from recuperation_json_2402_final import merge_responses  # noqa: E402
+from sync_state import SyncState  # noqa: E402
+from tri_json_2402_v0 import filter_events  # noqa: E402
+
+NOW = datetime(2025, 2, 10, 8, 0, tzinfo=timezone.utc)
+
+
+def esf_date(dt):
+    return f"/Date({int(dt.timestamp() * 1000)}+0100)/"
+
+
+def lesson(ih, start):
+    return {"ih": ih, "dd": esf_date(start), "df": esf_date(start + timedelta(hours=1)),
+            "dm": esf_date(NOW - timedelta(days=1)), "lp": "COURS PRIVE"}
+
+
+def fetch(items, now):
+    """Réponse ESF de la période [now, fin de saison["""
+    return {"Items": items, "Page": 0, "Pages": 0, "Total": len(items), "ServerTime": esf_date(now),
+            "DateDebut": esf_date(now), "DateFin": esf_date(datetime(2025, 4, 30, tzinfo=timezone.utc))}
+
+
+class RemovedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.past = lesson(1, NOW + timedelta(hours=1))       # commencé au 2e passage
+        self.cancelled = lesson(2, NOW + timedelta(days=3))   # annulé avant le 2e passage
+        self.kept = lesson(3, NOW + timedelta(days=5))
+        _, self.state = select_changes(fetch([self.past, self.cancelled, self.kept], NOW), {}, "diff")
+        self.later = NOW + timedelta(hours=2)
+
+    def test_started_lesson_is_not_removed(self):
+        data, _ = select_changes(fetch([self.kept], self.later), self.state, "diff")
+        self.assertEqual(data["Removed"], ["2"])
+
+    def test_incomplete_fetch_removes_nothing(self):
+        data, new_state = select_changes({**fetch([self.kept], self.later), "Incomplete": True}, self.state, "diff")
+        self.assertEqual(data["Removed"], [])
+        self.assertIn("2", new_state["items"])
+
+    def test_missing_planning_marks_merge_incomplete(self):
+        ok = fetch([self.kept], self.later)
+        for missing in ({"Message": "Erreur serveur"}, "<html>", None):
+            merged = merge_responses([ok, missing])
+            self.assertTrue(merged.get("Incomplete"))
+            self.assertEqual(merged["Total"], 1)
+        self.assertNotIn("Incomplete", merge_responses([ok, ok]))
+
+    def test_lesson_now_excluded_is_removed(self):
+        absent = {**self.kept, "lp": "ABSENT", "dm": esf_date(NOW)}
+        data, _ = select_changes(fetch([self.past, absent], self.later), self.state, "diff")
+        filtered = filter_events(data, load_rules(None))
+        self.assertEqual(filtered["Items"], [])
+        self.assertEqual(filtered["Removed"], ["2", "3"])
+        # Hors mode incrémental, Removed n'est pas créé
+        self.assertNotIn("Removed", filter_events(fetch([absent], self.later), load_rules(None)))
+
+    def test_plan_changes_keeps_started_lessons(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            state = SyncState(os.path.join(workdir, "sync_state.db"))
+            for item, google_id in ((self.past, "g1"), (self.cancelled, "g2"), (self.kept, "g3")):
+                start = datetime.fromtimestamp(int(item["dd"][6:-7]) / 1000, timezone.utc)
+                state.upsert(str(item["ih"]), google_id, "hash", item["dm"], start.timestamp())
+            _, _, deletes = plan_changes([], None, state, removed=["1", "2"],
+                                         removed_after=self.later.timestamp())
+            state.close()
+        self.assertEqual(deletes, [("2", "g2")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Ajouts idempotents : chaque cours est créé sous un identifiant Google déduit de son
+ih. Un ajout renvoyé alors que le premier a abouti (réponse perdue) ou l'identifiant
+d'un cours supprimé puis revenu donnent un 409 : l'événement existant est mis à jour
+et confirmé, sans doublon. Serveur Calendar de test : benchmarks/fake_services.py.
+"""
+import os
+import sys
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "scripts"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+os.environ.setdefault("CALENDAR_ID", "test")
+
+import import_cal_et_gen_mail_v1 as importer  # noqa: E402
+from fake_services import Faults, make_server  # noqa: E402
+from sync_state import SyncState  # noqa: E402
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def esf_date(dt):
+    return f"/Date({int(dt.timestamp() * 1000)}+0100)/"
+
+
+def lesson(ih, days):
+    start = NOW + timedelta(days=days)
+    return {"ih": ih, "dd": esf_date(start), "df": esf_date(start + timedelta(hours=1)),
+            "dm": esf_date(NOW - timedelta(days=1)), "lp": "COURS PRIVE"}
+
+
+class InsertRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = make_server("calendar", "127.0.0.1", 0, Faults(), page_size=2500)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.saved = {name: getattr(importer, name) for name in ("API_ENDPOINT", "BATCH_URI", "_service")}
+        importer.API_ENDPOINT = f"{base}/calendar/v3/"
+        importer.BATCH_URI = f"{base}/batch/calendar/v3"
+        importer._service = None
+        self.service = importer.get_google_calendar_service()
+        self.state = SyncState(":memory:")
+
+    def tearDown(self):
+        self.state.close()
+        self.server.shutdown()
+        self.server.server_close()
+        for name, value in self.saved.items():
+            setattr(importer, name, value)
+
+    def remote_events(self, calendar_id):
+        return [e for (cid, _), e in self.server.state.events.items() if cid == calendar_id]
+
+    def test_event_id_is_base32hex(self):
+        for ih in (1, 19358136, "abc"):
+            value = importer.event_id(ih)
+            self.assertEqual(value, importer.event_id(str(ih)))
+            self.assertGreaterEqual(len(value), 5)
+            self.assertTrue(set(value) <= set("0123456789abcdefghijklmnopqrstuv"))
+
+    def test_existing_ids_are_confirmed_without_duplicates(self):
+        events = self.service.events()
+        calendar_id = importer.CALENDAR_ID
+        slot = {"start": {"dateTime": NOW.isoformat()}, "end": {"dateTime": (NOW + timedelta(hours=1)).isoformat()}}
+        # Cours 1 : ajout abouti dont la réponse a été perdue ; cours 2 : supprimé auparavant
+        events.insert(calendarId=calendar_id, body={**slot, "id": importer.event_id(1)}).execute()
+        events.insert(calendarId=calendar_id, body={**slot, "id": importer.event_id(2)}).execute()
+        events.delete(calendarId=calendar_id, eventId=importer.event_id(2)).execute()
+
+        data = {"Items": [lesson(1, 2), lesson(2, 3), lesson(3, 4)], "ServerTime": esf_date(NOW)}
+        failed = importer._sync_events(data, self.service, self.state)
+
+        self.assertEqual(failed, [])
+        remote = self.remote_events(calendar_id)
+        self.assertEqual(len(remote), 3)
+        self.assertTrue(all(e["status"] == "confirmed" for e in remote))
+        self.assertEqual({ih: row[0] for ih, row in self.state.all().items()},
+                         {str(ih): importer.event_id(ih) for ih in (1, 2, 3)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Lecture et filtrage au fil de l'eau : le résultat doit être celui du chemin en
+mémoire (json.load puis filter_events).
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from filter_rules import load_rules  # noqa: E402
+from json_stream import iter_payload  # noqa: E402
+from tri_json_2402_v0 import filter_events, stream_filter  # noqa: E402
+
+
+def lesson(ih, lp="COURS PRIVE"):
+    return {"ih": ih, "dd": "/Date(1739181600000+0100)/", "df": "/Date(1739185200000+0100)/",
+            "dm": "/Date(1739095200000+0100)/", "lp": lp, "nm": "Élève"}
+
+
+class IterPayloadTest(unittest.TestCase):
+
+    def parse(self, text, chunk_size):
+        result = {"Items": []}
+        for kind, value in iter_payload(io.StringIO(text), chunk_size=chunk_size):
+            if kind == "item":
+                result["Items"].append(value)
+            else:
+                result[value[0]] = value[1]
+        return result
+
+    def test_matches_json_loads_at_small_chunk_sizes(self):
+        documents = [
+            '{"Items":[1,2.5]}',
+            '{"Items":[-1, 2.5e-3, 10E+2, 0.125, -0.0, true, false, null], "Total": 12345}',
+            '{"Page":0,"Items":[{"ih":19358136,"pr":45.5,"lp":"COURS PRIVE","nm":"\u00c9l\u00e8ve"}],"Pages":1.0}',
+            '{ "Items" : [ [1, 2], {"a": [3.75, {"b": -4e2}]} ] , "ServerTime" : "/Date(1739174400000+0100)/" }',
+        ]
+        for text in documents:
+            for chunk_size in range(1, 9):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    self.assertEqual(self.parse(text, chunk_size), {"Items": [], **json.loads(text)})
+
+
+class StreamFilterTest(unittest.TestCase):
+
+    def check(self, data):
+        with tempfile.TemporaryDirectory() as workdir:
+            input_path = os.path.join(workdir, "events.json")
+            output_path = os.path.join(workdir, "filtered_events.json")
+            with open(input_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            total = stream_filter(input_path, output_path, load_rules(None))
+            with open(output_path, "r", encoding="utf-8") as f:
+                streamed = json.load(f)
+        self.assertEqual(streamed, filter_events(data, load_rules(None)))
+        self.assertEqual(total, streamed["Total"])
+        return streamed
+
+    def test_all_keys_are_kept(self):
+        streamed = self.check({
+            "Page": 0, "Pages": 0, "Total": 3, "ServerTime": "/Date(1739174400000+0100)/",
+            "Items": [lesson(1), lesson(2, "ABSENT"), lesson(3)],
+            "DateDebut": "/Date(1739174400000+0100)/", "DateFin": "/Date(1746000000000+0100)/",
+            "Incomplete": True,
+        })
+        self.assertEqual([item["ih"] for item in streamed["Items"]], [1, 3])
+        self.assertTrue(streamed["Incomplete"])
+
+    def test_incremental_rejected_are_removed(self):
+        # Les métadonnées peuvent précéder Items
+        streamed = self.check({
+            "Incremental": True, "Removed": ["9"], "Page": 0, "Pages": 0, "Total": 2,
+            "ServerTime": "/Date(1739174400000+0100)/", "Items": [lesson(1), lesson(2, "ABSENT")],
+        })
+        self.assertEqual(streamed["Removed"], ["9", "2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Mesures d'un passage : les totaux sont tenus par étape (un même compteur, ex :
+items, n'a pas le même sens au fetch et à l'écriture) ; les octets reçus de
+l'API Google sont comptés par le client HTTP de chaque thread.
+"""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from google_executor import ApiExecutor, CountingHttp  # noqa: E402
+from run_metrics import RunMetrics  # noqa: E402
+
+
+class FakeHttp:
+    def request(self, uri, method="GET", body=None, headers=None):
+        return {"status": "200"}, b'{"items": []}'
+
+
+class TotalsTest(unittest.TestCase):
+    def test_totals_are_namespaced_by_stage(self):
+        run = RunMetrics("test")
+        with run.stage("fetch"):
+            run.count("items", 515)
+            with run.stage("login"):
+                run.count("requests")
+        with run.stage("write"):
+            run.count("items", 12)
+        run.count("runs")
+        self.assertEqual(run.totals, {"fetch.items": 515, "login.requests": 1, "write.items": 12, "runs": 1})
+        self.assertEqual(run.stages[-1]["counters"], {"items": 12})
+
+
+class ApiBytesTest(unittest.TestCase):
+    def test_bytes_in_are_recorded_per_call(self):
+        executor = ApiExecutor(rate=1000, http_factory=lambda: CountingHttp(FakeHttp()))
+        executor.call(lambda http: http.request("/a"))
+        executor.call(lambda http: (http.request("/b"), http.request("/c")))
+        self.assertEqual(executor.metrics.summary()["bytes_in"], 3 * len(b'{"items": []}'))
+        self.assertEqual(executor.metrics.summary(since=1)["bytes_in"], 2 * len(b'{"items": []}'))
+
+
+if __name__ == "__main__":
+    unittest.main()
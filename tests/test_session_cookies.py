@@ -0,0 +1,85 @@
+"""
+Cookies ESF du mode HTTP : le fichier de session n'est lu qu'au premier passage
+(ou renouvelé après un SessionExpired), et les cookies renouvelés par le serveur
+pendant les requêtes y sont réécrits.
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import esf_http  # noqa: E402
+import esf_session  # noqa: E402
+import recuperation_json_2402_final as recuperation  # noqa: E402
+
+PLANNING = {"Items": [], "Page": 0, "Pages": 0, "Total": 0, "ServerTime": "/Date(1739174400000+0100)/"}
+
+
+def storage_state(value):
+    return {"cookies": [{"name": "ESFSESSION", "value": value, "domain": "esf356.w-esf.com", "path": "/",
+                         "expires": -1, "httpOnly": True, "secure": True, "sameSite": "Lax"}],
+            "origins": []}
+
+
+class SessionCookiesTest(unittest.TestCase):
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, "esf_session.json")
+        esf_session.write_storage_state(storage_state("v1"), self.path)
+        self.session = esf_http.requests.Session()
+        self.loads = 0
+        self.responses = []
+
+        def load_storage_state():
+            self.loads += 1
+            return esf_session.load_storage_state(self.path)
+
+        async def run_jobs(jobs):
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            if isinstance(response, str):
+                # Le serveur renouvelle le cookie de session (Set-Cookie)
+                self.session.cookies.set("ESFSESSION", response, domain="esf356.w-esf.com", path="/")
+            return [PLANNING]
+
+        for name, value in (("_storage_state", None), ("load_storage_state", load_storage_state),
+                            ("run_jobs", run_jobs), ("build_jobs", lambda *args, **kwargs: []),
+                            ("get_http_session", lambda pool_size=10: self.session),
+                            ("write_storage_state", lambda state: esf_session.write_storage_state(state, self.path)),
+                            ("refresh_session_cookies", lambda sources: storage_state("login"))):
+            patcher = mock.patch.object(recuperation, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def saved_value(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)["cookies"][0]["value"]
+
+    def test_cookies_are_loaded_once_and_renewals_saved(self):
+        self.responses = [None, "v2", None]
+        for _ in range(3):
+            self.assertEqual(recuperation.get_esf_events_http([recuperation.DEFAULT_SOURCE]), PLANNING)
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.session.cookies.get("ESFSESSION"), "v2")
+        self.assertEqual(self.saved_value(), "v2")
+        saved = esf_session.load_storage_state(self.path)["cookies"][0]
+        self.assertTrue(saved["httpOnly"])
+
+    def test_expired_session_is_renewed(self):
+        self.responses = [None, esf_http.SessionExpired("302"), None, None]
+        for _ in range(3):
+            recuperation.get_esf_events_http([recuperation.DEFAULT_SOURCE])
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.session.cookies.get("ESFSESSION"), "login")
+
+
+if __name__ == "__main__":
+    unittest.main()